@@ -45,11 +45,17 @@ def crosswalk_county_name_to_county_fips_code(
     return county_fips_code
 
 
-def get_county_geoid(state_abrv: str, county_name: str) -> str:
+def get_county_geoid(
+    state_abrv: str,
+    county_name: str,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> str:
     state_abrv = state_abrv.upper()
     state_fips_code = crosswalk_state_abrv_to_state_fips_code(state_abrv=state_abrv)
     county_fips_code = crosswalk_county_name_to_county_fips_code(
-        state_abrv=state_abrv, county_name=county_name
+        state_abrv=state_abrv,
+        county_name=county_name,
+        project_root_dir=project_root_dir,
     )
     county_geoid = state_fips_code + county_fips_code
     return county_geoid
@@ -136,6 +142,14 @@ def load_tiger_boundary_lines_for_all_states(
     return gpd.read_file(file_path)
 
 
+def get_tiger_boundary_lines_for_all_counties_file_path(
+    year: str,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> os.path:
+    file_name = f"census_tiger_county_lines_{year}.zip"
+    return os.path.join(project_root_dir, "data_raw", "boundary", file_name)
+
+
 def extract_tiger_boundary_lines_for_all_counties(
     year: str,
     project_root_dir: os.path = get_project_root_dir(),
@@ -148,8 +162,9 @@ def extract_tiger_boundary_lines_for_all_counties(
     url = (
         f"https://www2.census.gov/geo/tiger/TIGER{year}/COUNTY/tl_{year}_us_county.zip"
     )
-    file_name = f"census_tiger_county_lines_{year}.zip"
-    file_path = os.path.join(project_root_dir, "data_raw", "boundary", file_name)
+    file_path = get_tiger_boundary_lines_for_all_counties_file_path(
+        year=year, project_root_dir=project_root_dir
+    )
     return extract_file_from_url(
         file_path=file_path, url=url, data_format="shp", return_df=False
     )
@@ -160,8 +175,9 @@ def load_tiger_boundary_lines_for_all_counties(
     project_root_dir: os.path = get_project_root_dir(),
 ) -> gpd.GeoDataFrame:
     """Returns TIGER boundary lines for all US counties."""
-    file_name = f"census_tiger_county_lines_{year}.zip"
-    file_path = os.path.join(project_root_dir, "data_raw", "boundary", file_name)
+    file_path = get_tiger_boundary_lines_for_all_counties_file_path(
+        year=year, project_root_dir=project_root_dir
+    )
     if not os.path.isfile(file_path):
         extract_tiger_boundary_lines_for_all_counties(
             year=year,
@@ -250,6 +266,16 @@ def extract_tiger_rail_lines_2021(
     )
 
 
+def get_tiger_roads_in_county_file_path(
+    state_abrv: str,
+    county_name: str,
+    year: str,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> os.path:
+    file_name = f"roads_in_{county_name.lower().replace(' ', '_')}_county_{state_abrv.upper()}_{year}.zip"
+    return os.path.join(project_root_dir, "data_raw", "roads", file_name)
+
+
 def extract_tiger_roads_in_county(
     state_abrv: str,
     county_name: str,
@@ -259,8 +285,12 @@ def extract_tiger_roads_in_county(
     county_geoid = get_county_geoid(state_abrv=state_abrv, county_name=county_name)
 
     url = f"https://www2.census.gov/geo/tiger/TIGER{year}/ROADS/tl_{year}_{county_geoid}_roads.zip"
-    file_name = f"roads_in_{county_name.lower().replace(' ', '_')}_county_{state_abrv.upper()}_{year}.zip"
-    file_path = os.path.join(project_root_dir, "data_raw", "roads", file_name)
+    file_path = get_tiger_roads_in_county_file_path(
+        state_abrv=state_abrv,
+        county_name=county_name,
+        year=year,
+        project_root_dir=project_root_dir,
+    )
 
     extract_file_from_url(
         file_path=file_path, url=url, data_format="shp", return_df=False
@@ -274,8 +304,12 @@ def load_tiger_roads_in_county(
     project_root_dir: os.path = get_project_root_dir(),
 ) -> gpd.GeoDataFrame:
     """load_tiger_county_roads_from_one_year"""
-    file_name = f"roads_in_{county_name.lower().replace(' ', '_')}_county_{state_abrv.upper()}_{year}.zip"
-    file_path = os.path.join(project_root_dir, "data_raw", "roads", file_name)
+    file_path = get_tiger_roads_in_county_file_path(
+        state_abrv=state_abrv,
+        county_name=county_name,
+        year=year,
+        project_root_dir=project_root_dir,
+    )
     if not os.path.isfile(file_path):
         extract_tiger_roads_in_county(
             state_abrv=state_abrv,
@@ -319,6 +353,16 @@ def load_tiger_us_coastline(
     return gpd.read_file(file_path)
 
 
+def get_tiger_county_area_hyrography_relationships_file_path(
+    state_abrv: str,
+    county_name: str,
+    year: str,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> os.path:
+    file_name = f"tiger_area_hydrography_relationships_in_{county_name.lower().replace(' ', '_')}_county_{state_abrv.upper()}_{year}.zip"
+    return os.path.join(project_root_dir, "data_raw", "topology", file_name)
+
+
 def extract_tiger_county_area_hyrography_relationships_for_year(
     state_abrv: str,
     county_name: str,
@@ -331,8 +375,12 @@ def extract_tiger_county_area_hyrography_relationships_for_year(
     county_geoid = get_county_geoid(state_abrv=state_abrv, county_name=county_name)
 
     url = f"https://www2.census.gov/geo/tiger/TIGER{year}/FACESAH/tl_{year}_{county_geoid}_facesah.zip"
-    file_name = f"tiger_area_hydrography_relationships_in_{county_name.lower().replace(' ', '_')}_county_{state_abrv.upper()}_{year}.zip"
-    file_path = os.path.join(project_root_dir, "data_raw", "topology", file_name)
+    file_path = get_tiger_county_area_hyrography_relationships_file_path(
+        state_abrv=state_abrv,
+        county_name=county_name,
+        year=year,
+        project_root_dir=project_root_dir,
+    )
 
     extract_file_from_url(
         file_path=file_path, url=url, data_format="shp", return_df=False
@@ -345,8 +393,12 @@ def load_tiger_county_area_hyrography_relationships_for_year(
     year: str,
     project_root_dir: os.path = get_project_root_dir(),
 ) -> gpd.GeoDataFrame:
-    file_name = f"tiger_area_hydrography_relationships_in_{county_name.lower().replace(' ', '_')}_county_{state_abrv.upper()}_{year}.zip"
-    file_path = os.path.join(project_root_dir, "data_raw", "topology", file_name)
+    file_path = get_tiger_county_area_hyrography_relationships_file_path(
+        state_abrv=state_abrv,
+        county_name=county_name,
+        year=year,
+        project_root_dir=project_root_dir,
+    )
     if not os.path.isfile(file_path):
         extract_tiger_county_area_hyrography_relationships_for_year(
             state_abrv=state_abrv,
@@ -357,36 +409,54 @@ def load_tiger_county_area_hyrography_relationships_for_year(
     return gpd.read_file(file_path)
 
 
-def extract_tiger_area_water_in_county(
+def get_tiger_topological_faces_in_county_file_path(
+    state_abrv: str,
+    county_name: str,
+    year: str,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> os.path:
+    file_name = f"tiger_topological_faces_in_{county_name.lower().replace(' ', '_')}_county_{state_abrv.upper()}_{year}.zip"
+    return os.path.join(project_root_dir, "data_raw", "topology", file_name)
+
+
+def extract_tiger_topological_faces_in_county(
     state_abrv: str,
     county_name: str,
     year: str,
     project_root_dir: os.path = get_project_root_dir(),
 ) -> None:
-    """TIGER description: Area Hydrography County-based Shapefile Record Layout
-    TIGER label: 'areawater'
+    """TIGER description: Topological Faces (Polygons With All Geocodes) Shapefile
+    TIGER label: 'faces'
     """
     county_geoid = get_county_geoid(state_abrv=state_abrv, county_name=county_name)
 
-    url = f"https://www2.census.gov/geo/tiger/TIGER{year}/AREAWATER/tl_{year}_{county_geoid}_areawater.zip"
-    file_name = f"tiger_area_water_in_{county_name.lower().replace(' ', '_')}_county_{state_abrv.upper()}_{year}.zip"
-    file_path = os.path.join(project_root_dir, "data_raw", "water", file_name)
+    url = f"https://www2.census.gov/geo/tiger/TIGER{year}/FACES/tl_{year}_{county_geoid}_faces.zip"
+    file_path = get_tiger_topological_faces_in_county_file_path(
+        state_abrv=state_abrv,
+        county_name=county_name,
+        year=year,
+        project_root_dir=project_root_dir,
+    )
 
     extract_file_from_url(
         file_path=file_path, url=url, data_format="shp", return_df=False
     )
 
 
-def load_tiger_area_water_in_county(
+def load_tiger_topological_faces_in_county(
     state_abrv: str,
     county_name: str,
     year: str,
     project_root_dir: os.path = get_project_root_dir(),
 ) -> gpd.GeoDataFrame:
-    file_name = f"tiger_area_water_in_{county_name.lower().replace(' ', '_')}_county_{state_abrv.upper()}_{year}.zip"
-    file_path = os.path.join(project_root_dir, "data_raw", "water", file_name)
+    file_path = get_tiger_topological_faces_in_county_file_path(
+        state_abrv=state_abrv,
+        county_name=county_name,
+        year=year,
+        project_root_dir=project_root_dir,
+    )
     if not os.path.isfile(file_path):
-        extract_tiger_area_water_in_county(
+        extract_tiger_topological_faces_in_county(
             state_abrv=state_abrv,
             county_name=county_name,
             year=year,
@@ -395,11 +465,174 @@ def load_tiger_area_water_in_county(
     return gpd.read_file(file_path)
 
 
+def get_tiger_topological_edges_in_county_file_path(
+    state_abrv: str,
+    county_name: str,
+    year: str,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> os.path:
+    file_name = f"tiger_topological_edges_in_{county_name.lower().replace(' ', '_')}_county_{state_abrv.upper()}_{year}.zip"
+    return os.path.join(project_root_dir, "data_raw", "topology", file_name)
+
+
+def extract_tiger_topological_edges_in_county(
+    state_abrv: str,
+    county_name: str,
+    year: str,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> None:
+    """TIGER description: All Lines County-based Shapefile
+    TIGER label: 'edges'
+    """
+    county_geoid = get_county_geoid(state_abrv=state_abrv, county_name=county_name)
+
+    url = f"https://www2.census.gov/geo/tiger/TIGER{year}/EDGES/tl_{year}_{county_geoid}_edges.zip"
+    file_path = get_tiger_topological_edges_in_county_file_path(
+        state_abrv=state_abrv,
+        county_name=county_name,
+        year=year,
+        project_root_dir=project_root_dir,
+    )
+
+    extract_file_from_url(
+        file_path=file_path, url=url, data_format="shp", return_df=False
+    )
+
+
+def load_tiger_topological_edges_in_county(
+    state_abrv: str,
+    county_name: str,
+    year: str,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> gpd.GeoDataFrame:
+    file_path = get_tiger_topological_edges_in_county_file_path(
+        state_abrv=state_abrv,
+        county_name=county_name,
+        year=year,
+        project_root_dir=project_root_dir,
+    )
+    if not os.path.isfile(file_path):
+        extract_tiger_topological_edges_in_county(
+            state_abrv=state_abrv,
+            county_name=county_name,
+            year=year,
+            project_root_dir=project_root_dir,
+        )
+    return gpd.read_file(file_path)
+
+
+def get_tiger_area_water_in_county_file_path(
+    state_abrv: str,
+    county_name: str,
+    year: str,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> os.path:
+    county_geoid = get_county_geoid(
+        state_abrv=state_abrv,
+        county_name=county_name,
+        project_root_dir=project_root_dir,
+    )
+    return get_tiger_area_water_for_county_geoid_file_path(
+        county_geoid=county_geoid, year=year, project_root_dir=project_root_dir
+    )
+
+
+def extract_tiger_area_water_in_county(
+    state_abrv: str,
+    county_name: str,
+    year: str,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> None:
+    county_geoid = get_county_geoid(
+        state_abrv=state_abrv,
+        county_name=county_name,
+        project_root_dir=project_root_dir,
+    )
+    extract_tiger_area_water_for_county_geoid(
+        county_geoid=county_geoid, year=year, project_root_dir=project_root_dir
+    )
+
+
+def load_tiger_area_water_in_county(
+    state_abrv: str,
+    county_name: str,
+    year: str,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> gpd.GeoDataFrame:
+    county_geoid = get_county_geoid(
+        state_abrv=state_abrv,
+        county_name=county_name,
+        project_root_dir=project_root_dir,
+    )
+    return load_tiger_area_water_for_county_geoid(
+        county_geoid=county_geoid, year=year, project_root_dir=project_root_dir
+    )
+
+
+def get_tiger_area_water_for_county_geoid_file_path(
+    county_geoid: str,
+    year: str,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> os.path:
+    """Keyed on the county's GEOID (STATEFP + COUNTYFP) rather than its name, since
+    names aren't unique within a state (eg Richmond city and Richmond County, VA)."""
+    file_name = f"tiger_area_water_in_county_{county_geoid}_{year}.zip"
+    return os.path.join(project_root_dir, "data_raw", "water", file_name)
+
+
+def extract_tiger_area_water_for_county_geoid(
+    county_geoid: str,
+    year: str,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> None:
+    """TIGER description: Area Hydrography County-based Shapefile Record Layout
+    TIGER label: 'areawater'
+    """
+    url = f"https://www2.census.gov/geo/tiger/TIGER{year}/AREAWATER/tl_{year}_{county_geoid}_areawater.zip"
+    file_path = get_tiger_area_water_for_county_geoid_file_path(
+        county_geoid=county_geoid, year=year, project_root_dir=project_root_dir
+    )
+
+    extract_file_from_url(
+        file_path=file_path, url=url, data_format="shp", return_df=False
+    )
+
+
+def load_tiger_area_water_for_county_geoid(
+    county_geoid: str,
+    year: str,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> gpd.GeoDataFrame:
+    file_path = get_tiger_area_water_for_county_geoid_file_path(
+        county_geoid=county_geoid, year=year, project_root_dir=project_root_dir
+    )
+    if not os.path.isfile(file_path):
+        extract_tiger_area_water_for_county_geoid(
+            county_geoid=county_geoid, year=year, project_root_dir=project_root_dir
+        )
+    return gpd.read_file(file_path)
+
+
 ########################################################################################
 ################################# Plotting and Mapping #################################
 ########################################################################################
 
 
+def get_roads_by_feature_class_map_file_path(
+    state_abrv: str,
+    county_name: str,
+    year: str,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> os.path:
+    cn = county_name.lower().replace(" ", "_")
+    sn = state_abrv.upper()
+    return os.path.join(
+        project_root_dir,
+        "output",
+        f"map_of_roads_in_{cn}_{sn}_in_{year}_by_road_feature_class.png",
+    )
+
+
 def add_county_water_to_map(
     state_abrv: str,
     county_name: str,
@@ -429,20 +662,31 @@ def plot_roads_by_feature_class_in_county_in_census_year(
     output_image: bool = False,
     pad_pct: float = 0.03,
     top_pad_mult: float = 2.5,
+    add_water: bool = False,
 ) -> None:
     if county_roads_gdf is None:
         county_roads_gdf = load_tiger_roads_in_county(
             state_abrv=state_abrv,
             county_name=county_name,
             year=year,
+            project_root_dir=project_root_dir,
         )
     county_gdf = load_tiger_boundary_lines_for_county(
         state_abrv=state_abrv,
         county_name=county_name,
         year=year,
         counties_gdf=counties_gdf,
+        project_root_dir=project_root_dir,
     )
     fig, ax = plt.subplots(figsize=(fig_width, fig_width))
+    if add_water:
+        ax = add_county_water_to_map(
+            state_abrv=state_abrv,
+            county_name=county_name,
+            year=year,
+            ax=ax,
+            project_root_dir=project_root_dir,
+        )
     ax = county_roads_gdf.loc[(county_roads_gdf["MTFCC"] == "S1740")].plot(
         color="#8c510a",
         label="Private Road",
@@ -508,15 +752,16 @@ def plot_roads_by_feature_class_in_county_in_census_year(
         frameon=False,
         markerscale=0.1,
     )
-    for legend_handle in lgnd.legendHandles:
+    # legendHandles was renamed legend_handles in matplotlib 3.7 and removed in 3.9
+    legend_handles = getattr(lgnd, "legend_handles", None) or lgnd.legendHandles
+    for legend_handle in legend_handles:
         legend_handle.set_linewidth(fig_width * 0.25)
     if output_image:
-        cn = county_name.lower().replace(" ", "_")
-        sn = state_abrv.upper()
-        output_image_file_path = os.path.join(
-            project_root_dir,
-            "output",
-            f"map_of_roads_in_{cn}_{sn}_in_{year}_by_road_feature_class.png",
+        output_image_file_path = get_roads_by_feature_class_map_file_path(
+            state_abrv=state_abrv,
+            county_name=county_name,
+            year=year,
+            project_root_dir=project_root_dir,
         )
         plt.savefig(
             output_image_file_path,
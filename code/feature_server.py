@@ -0,0 +1,488 @@
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Dict, List, Union, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from shapely.geometry import box
+
+from utils import get_project_root_dir
+from census_extract import (
+    get_county_geoid,
+    load_tiger_boundary_lines_for_all_counties,
+    load_tiger_roads_in_county,
+    load_tiger_area_water_in_county,
+    extract_tiger_rail_lines_2021,
+)
+from transpo_extract import extract_amtrak_routes, extract_amtrak_stations
+from broadband_extract import extract_fcc_broadband_area_coverage_12_2020
+from reprojection import reproject_gdf
+
+RESERVED_QUERY_PARAMS = ["bbox", "geoid", "format", "limit"]
+STREAM_BATCH_SIZE = 2_000
+READ_CHUNK_SIZE = 1024 * 1024
+REQUEST_TIMEOUT_SECONDS = 30.0
+
+
+########################################################################################
+#################################### Resident Layers ###################################
+########################################################################################
+
+
+def build_feature_layer(
+    df: Union[pd.DataFrame, gpd.GeoDataFrame],
+    geoid_column: Optional[str] = None,
+    attribute_columns: Optional[List[str]] = None,
+) -> Dict:
+    """Indexes a layer for serving: GeoJSON for each feature is encoded once up front,
+    geometries go into an STRtree for bbox queries, and GEOID and attribute lookups
+    are dicts of {value (as str): sorted row positions} for each of attribute_columns
+    (defaults to every non-geometry column)."""
+    df = df.reset_index(drop=True)
+    is_spatial = isinstance(df, gpd.GeoDataFrame)
+    if is_spatial:
+        df = reproject_gdf(gdf=df, target_crs="EPSG:4326")
+        geometry_json = shapely.to_geojson(df.geometry.values.to_numpy())
+        geometry_json[pd.isna(geometry_json)] = "null"
+        properties_df = pd.DataFrame(df.drop(columns=df.geometry.name))
+    else:
+        geometry_json = np.full(len(df), "null", dtype=object)
+        properties_df = df
+    if len(df) > 0:
+        properties_json = properties_df.to_json(
+            orient="records", lines=True, date_format="iso"
+        ).splitlines()
+    else:
+        properties_json = []
+    encoded_features = np.array(
+        [
+            f'{{"type":"Feature","properties":{props},"geometry":{geom}}}'.encode()
+            for props, geom in zip(properties_json, geometry_json)
+        ],
+        dtype=object,
+    )
+
+    if attribute_columns is None:
+        attribute_columns = list(properties_df.columns)
+    if (geoid_column is not None) and (geoid_column not in attribute_columns):
+        attribute_columns = attribute_columns + [geoid_column]
+    attribute_lookups = {
+        column: df.groupby(df[column].astype(str)).indices
+        for column in attribute_columns
+    }
+    return {
+        "df": df,
+        "is_spatial": is_spatial,
+        "sindex": df.sindex if is_spatial else None,
+        "geoid_column": geoid_column,
+        "geoid_lookup": attribute_lookups.get(geoid_column),
+        "attribute_lookups": attribute_lookups,
+        "encoded_features": encoded_features,
+    }
+
+
+def load_county_based_layer(
+    load_func,
+    county_list: List[Tuple[str, str]],
+    year: str,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> gpd.GeoDataFrame:
+    county_gdf_list = []
+    for state_abrv, county_name in county_list:
+        county_gdf = load_func(
+            state_abrv=state_abrv,
+            county_name=county_name,
+            year=year,
+            project_root_dir=project_root_dir,
+        )
+        county_gdf["COUNTY_GEOID"] = get_county_geoid(
+            state_abrv=state_abrv, county_name=county_name
+        )
+        county_gdf_list.append(county_gdf)
+    return pd.concat(county_gdf_list, ignore_index=True)
+
+
+def load_feature_layers(
+    county_list: List[Tuple[str, str]],
+    year: str = "2021",
+    project_root_dir: os.path = get_project_root_dir(),
+) -> Dict[str, Dict]:
+    """Loads and indexes every served layer. Roads and area water are county-based, so
+    only the (state_abrv, county_name) pairs in county_list are kept resident."""
+    feature_layers = {
+        "counties": build_feature_layer(
+            load_tiger_boundary_lines_for_all_counties(
+                year=year, project_root_dir=project_root_dir
+            ),
+            geoid_column="GEOID",
+        ),
+        "rail_lines": build_feature_layer(
+            extract_tiger_rail_lines_2021(project_root_dir=project_root_dir),
+            geoid_column="LINEARID",
+        ),
+        "amtrak_routes": build_feature_layer(
+            extract_amtrak_routes(project_root_dir=project_root_dir)
+        ),
+        "amtrak_stations": build_feature_layer(
+            extract_amtrak_stations(project_root_dir=project_root_dir)
+        ),
+        "fcc_coverage": build_feature_layer(
+            extract_fcc_broadband_area_coverage_12_2020(
+                project_root_dir=project_root_dir
+            ),
+            geoid_column="id",
+        ),
+    }
+    if len(county_list) > 0:
+        feature_layers["roads"] = build_feature_layer(
+            load_county_based_layer(
+                load_func=load_tiger_roads_in_county,
+                county_list=county_list,
+                year=year,
+                project_root_dir=project_root_dir,
+            ),
+            geoid_column="COUNTY_GEOID",
+        )
+        feature_layers["area_water"] = build_feature_layer(
+            load_county_based_layer(
+                load_func=load_tiger_area_water_in_county,
+                county_list=county_list,
+                year=year,
+                project_root_dir=project_root_dir,
+            ),
+            geoid_column="COUNTY_GEOID",
+        )
+    return feature_layers
+
+
+def lookup_positions(lookup: Dict[str, np.ndarray], values: List[str]) -> np.ndarray:
+    return np.unique(
+        np.concatenate(
+            [lookup.get(value, np.array([], dtype="int64")) for value in values]
+        )
+    )
+
+
+def query_feature_layer(
+    feature_layer: Dict, query_params: Dict[str, str]
+) -> np.ndarray:
+    """Returns the (sorted) row positions matching the bbox, geoid and attribute
+    equality filters in query_params, intersecting the index hits for each filter."""
+    position_sets = []
+    if "bbox" in query_params.keys():
+        if not feature_layer["is_spatial"]:
+            raise ValueError("bbox queries aren't supported for non-spatial layers")
+        min_x, min_y, max_x, max_y = [
+            float(v) for v in query_params["bbox"].split(",")
+        ]
+        position_sets.append(
+            np.unique(
+                feature_layer["sindex"].query(
+                    box(min_x, min_y, max_x, max_y), predicate="intersects"
+                )
+            )
+        )
+    if "geoid" in query_params.keys():
+        if feature_layer["geoid_lookup"] is None:
+            raise ValueError("geoid queries aren't supported for this layer")
+        position_sets.append(
+            lookup_positions(
+                feature_layer["geoid_lookup"], query_params["geoid"].split(",")
+            )
+        )
+    for column, value in query_params.items():
+        if column in RESERVED_QUERY_PARAMS:
+            continue
+        if column not in feature_layer["attribute_lookups"].keys():
+            raise ValueError(f"Unknown or unindexed attribute: {column}")
+        position_sets.append(
+            lookup_positions(feature_layer["attribute_lookups"][column], [value])
+        )
+
+    if len(position_sets) == 0:
+        positions = np.arange(len(feature_layer["df"]))
+    else:
+        position_sets.sort(key=len)
+        positions = position_sets[0]
+        for other_positions in position_sets[1:]:
+            positions = np.intersect1d(positions, other_positions, assume_unique=True)
+    if "limit" in query_params.keys():
+        positions = positions[: int(query_params["limit"])]
+    return positions
+
+
+########################################################################################
+###################################### HTTP Server #####################################
+########################################################################################
+
+
+async def write_chunk(writer: asyncio.StreamWriter, data: bytes) -> None:
+    if len(data) > 0:
+        writer.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        await writer.drain()
+
+
+async def write_response_head(
+    writer: asyncio.StreamWriter, status: str, content_type: str
+) -> None:
+    writer.write(
+        (
+            f"HTTP/1.1 {status}\r\n"
+            + f"Content-Type: {content_type}\r\n"
+            + "Transfer-Encoding: chunked\r\n"
+            + "Connection: close\r\n\r\n"
+        ).encode()
+    )
+
+
+async def write_json_response(
+    writer: asyncio.StreamWriter, status: str, body: Dict
+) -> None:
+    await write_response_head(writer, status, "application/json")
+    await write_chunk(writer, json.dumps(body).encode())
+    writer.write(b"0\r\n\r\n")
+
+
+async def stream_geojson(
+    writer: asyncio.StreamWriter, feature_layer: Dict, positions: np.ndarray
+) -> None:
+    """Streams a FeatureCollection STREAM_BATCH_SIZE features per chunk, awaiting
+    drain() between chunks so slow clients apply backpressure."""
+    await write_response_head(writer, "200 OK", "application/geo+json")
+    encoded_features = feature_layer["encoded_features"]
+    await write_chunk(writer, b'{"type":"FeatureCollection","features":[')
+    for start in range(0, len(positions), STREAM_BATCH_SIZE):
+        batch = encoded_features[positions[start : start + STREAM_BATCH_SIZE]]
+        prefix = b"," if start > 0 else b""
+        await write_chunk(writer, prefix + b",".join(batch))
+    await write_chunk(writer, b"]}")
+    writer.write(b"0\r\n\r\n")
+
+
+async def stream_flatgeobuf(
+    writer: asyncio.StreamWriter, feature_layer: Dict, positions: np.ndarray
+) -> None:
+    """FlatGeobuf is written by GDAL, so the subset is written to a temporary file in a
+    worker thread and then streamed out in READ_CHUNK_SIZE chunks."""
+    subset_gdf = feature_layer["df"].iloc[positions]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, "features.fgb")
+        await asyncio.to_thread(subset_gdf.to_file, file_path, driver="FlatGeobuf")
+        await write_response_head(writer, "200 OK", "application/flatgeobuf")
+        with open(file_path, "rb") as f:
+            while True:
+                data = await asyncio.to_thread(f.read, READ_CHUNK_SIZE)
+                if len(data) == 0:
+                    break
+                await write_chunk(writer, data)
+    writer.write(b"0\r\n\r\n")
+
+
+async def handle_request(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    feature_layers: Dict[str, Dict],
+) -> None:
+    """Routes:
+    GET /layers
+    GET /layers/<layer_name>?bbox=minx,miny,maxx,maxy&geoid=<id,...>&<COLUMN>=<value>
+        &format=geojson|fgb&limit=<n>
+    """
+    try:
+        request_line = (await reader.readline()).decode("latin-1")
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        method, target, _ = request_line.split(" ", 2)
+        url = urlsplit(target)
+        query_params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        path_parts = [part for part in url.path.split("/") if part != ""]
+        if method != "GET":
+            await write_json_response(writer, "405 Method Not Allowed", {})
+        elif path_parts == ["layers"]:
+            layer_summary = {
+                layer_name: {
+                    "n_features": len(layer["df"]),
+                    "is_spatial": layer["is_spatial"],
+                    "geoid_column": layer["geoid_column"],
+                    "columns": [str(c) for c in layer["df"].columns],
+                }
+                for layer_name, layer in feature_layers.items()
+            }
+            await write_json_response(writer, "200 OK", layer_summary)
+        elif (
+            len(path_parts) == 2
+            and path_parts[0] == "layers"
+            and path_parts[1] in feature_layers.keys()
+        ):
+            feature_layer = feature_layers[path_parts[1]]
+            try:
+                positions = query_feature_layer(feature_layer, query_params)
+            except ValueError as err:
+                await write_json_response(
+                    writer, "400 Bad Request", {"error": str(err)}
+                )
+            else:
+                response_format = query_params.get("format", "geojson").lower()
+                if response_format == "fgb" and feature_layer["is_spatial"]:
+                    await stream_flatgeobuf(writer, feature_layer, positions)
+                elif response_format == "geojson":
+                    await stream_geojson(writer, feature_layer, positions)
+                else:
+                    await write_json_response(
+                        writer,
+                        "400 Bad Request",
+                        {"error": f"Unsupported format: {response_format}"},
+                    )
+        else:
+            await write_json_response(writer, "404 Not Found", {})
+        await writer.drain()
+    except (ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_feature_layers(
+    feature_layers: Dict[str, Dict], host: str = "127.0.0.1", port: int = 8765
+) -> None:
+    server = await asyncio.start_server(
+        lambda reader, writer: handle_request(reader, writer, feature_layers),
+        host=host,
+        port=port,
+    )
+    print(f"Serving {', '.join(feature_layers.keys())} on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+########################################################################################
+#################################### Load Generator ####################################
+########################################################################################
+
+
+async def read_get_response(host: str, port: int, path: str) -> Tuple[bytes, int]:
+    """Returns (status_line, n_bytes) of a GET, reading the body to the end."""
+    reader, writer = await asyncio.open_connection(host=host, port=port)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+        await writer.drain()
+        status_line = await reader.readline()
+        n_bytes = len(status_line)
+        while True:
+            data = await reader.read(READ_CHUNK_SIZE)
+            if len(data) == 0:
+                break
+            n_bytes += len(data)
+    finally:
+        writer.close()
+    return status_line, n_bytes
+
+
+async def timed_get(
+    host: str, port: int, path: str, timeout_s: float = REQUEST_TIMEOUT_SECONDS
+) -> Tuple[float, int, int]:
+    """Returns (latency_s, n_bytes, status), with a status of 0 if the connection
+    failed (refused, DNS, reset, etc) or the response took longer than timeout_s."""
+    start_time = time.perf_counter()
+    try:
+        status_line, n_bytes = await asyncio.wait_for(
+            read_get_response(host=host, port=port, path=path), timeout=timeout_s
+        )
+    except (OSError, asyncio.TimeoutError):
+        return time.perf_counter() - start_time, 0, 0
+    try:
+        status = int(status_line.split(b" ", 2)[1])
+    except (IndexError, ValueError):
+        status = 0
+    return time.perf_counter() - start_time, n_bytes, status
+
+
+async def run_load_test(
+    paths: List[str],
+    n_requests: int = 1_000,
+    concurrency: int = 32,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    timeout_s: float = REQUEST_TIMEOUT_SECONDS,
+) -> Dict[str, float]:
+    """Issues n_requests GETs (cycling through paths) with at most concurrency requests
+    in flight. Latency percentiles and throughput only cover 2xx responses; failed
+    connections, timeouts and error statuses are counted separately in n_errors."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited_get(path: str) -> Tuple[float, int, int]:
+        async with semaphore:
+            return await timed_get(
+                host=host, port=port, path=path, timeout_s=timeout_s
+            )
+
+    start_time = time.perf_counter()
+    results = await asyncio.gather(
+        *[limited_get(paths[i % len(paths)]) for i in range(n_requests)]
+    )
+    elapsed = time.perf_counter() - start_time
+    ok_results = [result for result in results if 200 <= result[2] < 300]
+    latencies_ms = np.array([latency for latency, _, _ in ok_results]) * 1_000
+    total_bytes = sum(n_bytes for _, n_bytes, _ in ok_results)
+    if len(ok_results) == 0:
+        latencies_ms = np.array([np.nan])
+    return {
+        "n_requests": n_requests,
+        "n_ok": len(ok_results),
+        "n_errors": n_requests - len(ok_results),
+        "concurrency": concurrency,
+        "p50_latency_ms": float(np.percentile(latencies_ms, 50)),
+        "p99_latency_ms": float(np.percentile(latencies_ms, 99)),
+        "requests_per_sec": len(ok_results) / elapsed,
+        "mb_per_sec": total_bytes / elapsed / 1e6,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve TIGER/DOT/FCC feature layers")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve")
+    serve_parser.add_argument(
+        "--county", action="append", default=[], help='eg "MI:Kalamazoo"'
+    )
+    serve_parser.add_argument("--year", default="2021")
+    bench_parser = subparsers.add_parser("bench")
+    bench_parser.add_argument("paths", nargs="+", help='eg "/layers/roads?geoid=26077"')
+    bench_parser.add_argument("--n-requests", type=int, default=1_000)
+    bench_parser.add_argument("--concurrency", type=int, default=32)
+    for sub_parser in [serve_parser, bench_parser]:
+        sub_parser.add_argument("--host", default="127.0.0.1")
+        sub_parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        county_list = [tuple(county.split(":", 1)) for county in args.county]
+        feature_layers = load_feature_layers(county_list=county_list, year=args.year)
+        asyncio.run(
+            serve_feature_layers(
+                feature_layers=feature_layers, host=args.host, port=args.port
+            )
+        )
+    else:
+        load_test_results = asyncio.run(
+            run_load_test(
+                paths=args.paths,
+                n_requests=args.n_requests,
+                concurrency=args.concurrency,
+                host=args.host,
+                port=args.port,
+            )
+        )
+        for metric, value in load_test_results.items():
+            print(f"{metric}: {value:,.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Union, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from utils import get_project_root_dir
+from census_extract import (
+    crosswalk_state_abrv_to_state_fips_code,
+    load_tiger_boundary_lines_for_all_counties,
+    extract_tiger_boundary_lines_for_all_census_tracts_in_state,
+    get_tiger_area_water_for_county_geoid_file_path,
+    extract_tiger_area_water_for_county_geoid,
+)
+from reprojection import reproject_gdf
+
+AREA_CRS = "EPSG:5070"  # Conus Albers (equal-area)
+
+
+########################################################################################
+#################################### Water Removal #####################################
+########################################################################################
+
+
+def subtract_water_from_geometries(
+    geometries: np.ndarray, water_geometries: np.ndarray
+) -> np.ndarray:
+    """Returns geometries minus any water they overlap. Only the water polygons an
+    STRtree flags as intersecting a geometry are unioned and differenced from it, so
+    a tract is never differenced against the whole county's water layer."""
+    land_geometries = geometries.copy()
+    if len(water_geometries) == 0:
+        return land_geometries
+    water_geometries = shapely.make_valid(water_geometries)
+    water_tree = shapely.STRtree(water_geometries)
+    geometry_ids, water_ids = water_tree.query(geometries, predicate="intersects")
+    if len(geometry_ids) == 0:
+        return land_geometries
+    order = np.argsort(geometry_ids, kind="stable")
+    geometry_ids = geometry_ids[order]
+    water_ids = water_ids[order]
+    split_points = np.flatnonzero(np.diff(geometry_ids)) + 1
+    for group_geometry_ids, group_water_ids in zip(
+        np.split(geometry_ids, split_points), np.split(water_ids, split_points)
+    ):
+        geometry_id = group_geometry_ids[0]
+        land_geometries[geometry_id] = shapely.difference(
+            shapely.make_valid(geometries[geometry_id]),
+            shapely.union_all(water_geometries[group_water_ids]),
+        )
+    return land_geometries
+
+
+def compute_land_only_geometries_in_county(
+    water_file_path: os.path,
+    boundaries_gdf: gpd.GeoDataFrame,
+) -> gpd.GeoDataFrame:
+    """Removes the county's TIGER area water (an already extracted zip) from
+    boundaries_gdf (the county and its tracts). Run once per county in worker
+    processes."""
+    water_gdf = gpd.read_file(water_file_path)
+    water_gdf = reproject_gdf(gdf=water_gdf, target_crs=boundaries_gdf.crs)
+    boundaries_gdf = boundaries_gdf.copy()
+    boundaries_gdf["geometry"] = subtract_water_from_geometries(
+        geometries=boundaries_gdf.geometry.values.to_numpy(),
+        water_geometries=water_gdf.geometry.values.to_numpy(),
+    )
+    return boundaries_gdf
+
+
+########################################################################################
+####################################### Pipeline #######################################
+########################################################################################
+
+
+def get_land_only_boundaries_file_path(
+    boundary_type: str,
+    state_abrv: str,
+    year: str,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> os.path:
+    assert boundary_type in ["county", "tract"]
+    return os.path.join(
+        project_root_dir,
+        "data_clean",
+        "land_only_boundaries",
+        year,
+        f"land_only_{boundary_type}_boundaries_{state_abrv.upper()}_{year}.parquet",
+    )
+
+
+def add_land_area_column(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    gdf = gdf.copy()
+    gdf["land_area_m2"] = reproject_gdf(gdf=gdf, target_crs=AREA_CRS).area.values
+    return gdf
+
+
+def build_land_only_boundaries_for_state(
+    state_abrv: str,
+    year: str,
+    counties_gdf: Optional[gpd.GeoDataFrame] = None,
+    n_workers: Optional[int] = None,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> Tuple[gpd.GeoDataFrame, gpd.GeoDataFrame]:
+    """Computes land-only county and tract boundaries for every county in the state,
+    in parallel across counties, and caches them (by vintage) as GeoParquet under
+    data_clean/land_only_boundaries/<year>/. Both outputs keep the TIGER columns and
+    add a land_area_m2 column."""
+    state_abrv = state_abrv.upper()
+    state_fips_code = crosswalk_state_abrv_to_state_fips_code(state_abrv=state_abrv)
+    if counties_gdf is None:
+        counties_gdf = load_tiger_boundary_lines_for_all_counties(
+            year=year, project_root_dir=project_root_dir
+        )
+    state_counties_gdf = counties_gdf.loc[counties_gdf["STATEFP"] == state_fips_code]
+    state_counties_gdf = state_counties_gdf.reset_index(drop=True)
+    tracts_gdf = extract_tiger_boundary_lines_for_all_census_tracts_in_state(
+        state_abrv=state_abrv,
+        year=year,
+        project_root_dir=project_root_dir,
+        return_df=True,
+    )
+    tracts_gdf = reproject_gdf(gdf=tracts_gdf, target_crs=state_counties_gdf.crs)
+
+    # Water is fetched here, by GEOID, before fanning out so workers only read files
+    # and never race to download zips or build the county name crosswalk.
+    water_file_paths = []
+    for county_geoid in (
+        state_counties_gdf["STATEFP"] + state_counties_gdf["COUNTYFP"]
+    ).tolist():
+        extract_tiger_area_water_for_county_geoid(
+            county_geoid=county_geoid, year=year, project_root_dir=project_root_dir
+        )
+        water_file_paths.append(
+            get_tiger_area_water_for_county_geoid_file_path(
+                county_geoid=county_geoid, year=year, project_root_dir=project_root_dir
+            )
+        )
+
+    boundary_gdf_list = []
+    for _, county in state_counties_gdf.iterrows():
+        county_boundary_gdf = state_counties_gdf.loc[
+            state_counties_gdf["COUNTYFP"] == county["COUNTYFP"]
+        ].assign(boundary_type="county")
+        county_tracts_gdf = tracts_gdf.loc[
+            tracts_gdf["COUNTYFP"] == county["COUNTYFP"]
+        ].assign(boundary_type="tract")
+        boundary_gdf_list.append(
+            pd.concat([county_boundary_gdf, county_tracts_gdf], ignore_index=True)
+        )
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        land_gdf_list = list(
+            executor.map(
+                compute_land_only_geometries_in_county,
+                water_file_paths,
+                boundary_gdf_list,
+            )
+        )
+    land_gdf = add_land_area_column(pd.concat(land_gdf_list, ignore_index=True))
+
+    boundary_columns = {
+        "county": list(state_counties_gdf.columns),
+        "tract": list(tracts_gdf.columns),
+    }
+    land_gdfs = {}
+    for boundary_type in ["county", "tract"]:
+        boundary_land_gdf = land_gdf.loc[
+            land_gdf["boundary_type"] == boundary_type,
+            boundary_columns[boundary_type] + ["land_area_m2"],
+        ]
+        boundary_land_gdf = boundary_land_gdf.reset_index(drop=True)
+        file_path = get_land_only_boundaries_file_path(
+            boundary_type=boundary_type,
+            state_abrv=state_abrv,
+            year=year,
+            project_root_dir=project_root_dir,
+        )
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        boundary_land_gdf.to_parquet(file_path)
+        land_gdfs[boundary_type] = boundary_land_gdf
+    return land_gdfs["county"], land_gdfs["tract"]
+
+
+def load_land_only_boundaries_for_state(
+    boundary_type: str,
+    state_abrv: str,
+    year: str,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> gpd.GeoDataFrame:
+    """Returns cached land-only "county" or "tract" boundaries, building them if
+    needed. The county output is what roads maps built with land_only=True (see
+    map_builds) outline instead of the TIGER county boundary."""
+    file_path = get_land_only_boundaries_file_path(
+        boundary_type=boundary_type,
+        state_abrv=state_abrv,
+        year=year,
+        project_root_dir=project_root_dir,
+    )
+    if not os.path.isfile(file_path):
+        build_land_only_boundaries_for_state(
+            state_abrv=state_abrv, year=year, project_root_dir=project_root_dir
+        )
+    return gpd.read_parquet(file_path)
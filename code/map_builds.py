@@ -0,0 +1,285 @@
+import hashlib
+import inspect
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Union, Optional
+
+import pandas as pd
+import matplotlib.pyplot as plt
+
+from utils import get_project_root_dir, get_file_fingerprint
+from census_extract import (
+    get_tiger_roads_in_county_file_path,
+    get_tiger_boundary_lines_for_all_counties_file_path,
+    get_tiger_area_water_in_county_file_path,
+    get_roads_by_feature_class_map_file_path,
+    extract_tiger_roads_in_county,
+    extract_tiger_boundary_lines_for_all_counties,
+    extract_tiger_area_water_in_county,
+    add_county_water_to_map,
+    plot_roads_by_feature_class_in_county_in_census_year,
+)
+from land_geometries import (
+    get_land_only_boundaries_file_path,
+    build_land_only_boundaries_for_state,
+    load_land_only_boundaries_for_state,
+)
+
+PLOT_PARAMS = ["fig_width", "pad_pct", "top_pad_mult", "add_water"]
+# land_only outlines the county's land (see land_geometries) rather than its TIGER
+# boundary, which runs out into lakes and coastal water
+RENDER_PARAMS = PLOT_PARAMS + ["land_only"]
+DEFAULT_RENDER_PARAMS = {
+    "fig_width": 20,
+    "pad_pct": 0.03,
+    "top_pad_mult": 2.5,
+    "add_water": False,
+    "land_only": False,
+}
+
+
+########################################################################################
+################################# Artifact Fingerprints ################################
+########################################################################################
+
+
+def get_map_builds_manifest_file_path(
+    project_root_dir: os.path = get_project_root_dir(),
+) -> os.path:
+    return os.path.join(project_root_dir, "data_clean", "map_builds_manifest.json")
+
+
+def get_map_style_fingerprint() -> str:
+    """Colors, line widths, etc are hard-coded in the plotting functions, so the style
+    fingerprint is a hash of their source."""
+    style_source = inspect.getsource(
+        plot_roads_by_feature_class_in_county_in_census_year
+    ) + inspect.getsource(add_county_water_to_map)
+    return hashlib.sha256(style_source.encode()).hexdigest()[:16]
+
+
+def get_map_input_fingerprints(
+    map_spec: Dict,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> Dict[str, str]:
+    """Returns {input_name: fingerprint} for every input of a roads map, pulling any
+    raw inputs that haven't been extracted yet."""
+    county_kwargs = {
+        "state_abrv": map_spec["state_abrv"],
+        "county_name": map_spec["county_name"],
+        "year": map_spec["year"],
+        "project_root_dir": project_root_dir,
+    }
+    input_files = {
+        "roads_zip": (
+            get_tiger_roads_in_county_file_path(**county_kwargs),
+            lambda: extract_tiger_roads_in_county(**county_kwargs),
+        ),
+        "county_boundaries_zip": (
+            get_tiger_boundary_lines_for_all_counties_file_path(
+                year=map_spec["year"], project_root_dir=project_root_dir
+            ),
+            lambda: extract_tiger_boundary_lines_for_all_counties(
+                year=map_spec["year"], project_root_dir=project_root_dir
+            ),
+        ),
+    }
+    if map_spec["add_water"]:
+        input_files["area_water_zip"] = (
+            get_tiger_area_water_in_county_file_path(**county_kwargs),
+            lambda: extract_tiger_area_water_in_county(**county_kwargs),
+        )
+    if map_spec["land_only"]:
+        input_files["land_only_county_boundaries"] = (
+            get_land_only_boundaries_file_path(
+                boundary_type="county",
+                state_abrv=map_spec["state_abrv"],
+                year=map_spec["year"],
+                project_root_dir=project_root_dir,
+            ),
+            lambda: build_land_only_boundaries_for_state(
+                state_abrv=map_spec["state_abrv"],
+                year=map_spec["year"],
+                project_root_dir=project_root_dir,
+            ),
+        )
+
+    input_fingerprints = {}
+    for input_name, (file_path, extract_func) in input_files.items():
+        if not os.path.isfile(file_path):
+            extract_func()
+        input_fingerprints[input_name] = get_file_fingerprint(file_path)
+    for param in RENDER_PARAMS:
+        input_fingerprints[param] = str(map_spec[param])
+    input_fingerprints["style"] = get_map_style_fingerprint()
+    return input_fingerprints
+
+
+def get_stale_inputs(
+    input_fingerprints: Dict[str, str],
+    built_fingerprints: Optional[Dict[str, str]],
+    output_file_path: os.path,
+) -> List[str]:
+    """Names of the inputs whose fingerprints differ from the last build (or why the
+    artifact is missing)."""
+    if not os.path.isfile(output_file_path):
+        return ["output missing"]
+    if built_fingerprints is None:
+        return ["no build record"]
+    all_inputs = sorted(set(input_fingerprints.keys()) | set(built_fingerprints.keys()))
+    return [
+        input_name
+        for input_name in all_inputs
+        if input_fingerprints.get(input_name) != built_fingerprints.get(input_name)
+    ]
+
+
+########################################################################################
+######################################## Build #########################################
+########################################################################################
+
+
+def render_roads_map(
+    map_spec: Dict, project_root_dir: os.path = get_project_root_dir()
+) -> None:
+    plt.switch_backend("Agg")
+    counties_gdf = None
+    if map_spec["land_only"]:
+        counties_gdf = load_land_only_boundaries_for_state(
+            boundary_type="county",
+            state_abrv=map_spec["state_abrv"],
+            year=map_spec["year"],
+            project_root_dir=project_root_dir,
+        )
+    plot_roads_by_feature_class_in_county_in_census_year(
+        state_abrv=map_spec["state_abrv"],
+        county_name=map_spec["county_name"],
+        year=map_spec["year"],
+        counties_gdf=counties_gdf,
+        project_root_dir=project_root_dir,
+        output_image=True,
+        **{param: map_spec[param] for param in PLOT_PARAMS},
+    )
+    plt.close("all")
+
+
+def build_roads_maps(
+    map_specs: List[Dict],
+    force_rebuild: bool = False,
+    n_workers: Optional[int] = None,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> pd.DataFrame:
+    """Re-renders only the roads maps in output/ whose inputs (raw zips, render params
+    or plotting code) changed since they were last built, in parallel.
+
+    Each map_spec needs state_abrv, county_name and year, and can override any of
+    DEFAULT_RENDER_PARAMS. Maps are named by state, county and year only, so at most
+    one spec per county and year is allowed. Returns one row per map with the inputs
+    that caused its rebuild (empty if it was up to date) and, if rendering it failed,
+    the error. Only maps that rendered are recorded in the manifest, so failed ones
+    are retried on the next build.
+    """
+    manifest_file_path = get_map_builds_manifest_file_path(
+        project_root_dir=project_root_dir
+    )
+    if os.path.isfile(manifest_file_path):
+        with open(manifest_file_path, "r") as f:
+            manifest = json.load(f)
+    else:
+        manifest = {}
+
+    output_file_paths = [
+        get_roads_by_feature_class_map_file_path(
+            state_abrv=map_spec["state_abrv"],
+            county_name=map_spec["county_name"],
+            year=map_spec["year"],
+            project_root_dir=project_root_dir,
+        )
+        for map_spec in map_specs
+    ]
+    output_file_names = [os.path.basename(path) for path in output_file_paths]
+    duplicate_file_names = sorted(
+        {name for name in output_file_names if output_file_names.count(name) > 1}
+    )
+    if len(duplicate_file_names) > 0:
+        raise ValueError(
+            "Map specs for the same county and year would overwrite each other: "
+            + ", ".join(duplicate_file_names)
+        )
+
+    build_results = []
+    stale_map_specs = []
+    for map_spec, output_file_path, output_file_name in zip(
+        map_specs, output_file_paths, output_file_names
+    ):
+        map_spec = {**DEFAULT_RENDER_PARAMS, **map_spec}
+        input_fingerprints = get_map_input_fingerprints(
+            map_spec=map_spec, project_root_dir=project_root_dir
+        )
+        stale_inputs = get_stale_inputs(
+            input_fingerprints=input_fingerprints,
+            built_fingerprints=manifest.get(output_file_name),
+            output_file_path=output_file_path,
+        )
+        if force_rebuild and len(stale_inputs) == 0:
+            stale_inputs = ["forced"]
+        build_result = {
+            "output_file_name": output_file_name,
+            "rebuilt": False,
+            "stale_inputs": stale_inputs,
+            "error": None,
+        }
+        if len(stale_inputs) > 0:
+            stale_map_specs.append((map_spec, build_result, input_fingerprints))
+        build_results.append(build_result)
+
+    if len(stale_map_specs) > 0:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            future_to_stale_map_spec = {
+                executor.submit(render_roads_map, map_spec, project_root_dir): (
+                    build_result,
+                    input_fingerprints,
+                )
+                for map_spec, build_result, input_fingerprints in stale_map_specs
+            }
+            for future in as_completed(future_to_stale_map_spec):
+                build_result, input_fingerprints = future_to_stale_map_spec[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    build_result["error"] = repr(e)
+                    continue
+                build_result["rebuilt"] = True
+                manifest[build_result["output_file_name"]] = input_fingerprints
+        os.makedirs(os.path.dirname(manifest_file_path), exist_ok=True)
+        tmp_file_path = f"{manifest_file_path}.{os.getpid()}.tmp"
+        with open(tmp_file_path, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_file_path, manifest_file_path)
+    return pd.DataFrame(build_results)
+
+
+def main() -> None:
+    build_results_df = build_roads_maps(
+        map_specs=[
+            {"state_abrv": "MI", "county_name": "Berrien", "year": "2021"},
+            {"state_abrv": "MI", "county_name": "Kalamazoo", "year": "2021"},
+            {"state_abrv": "MI", "county_name": "Van Buren", "year": "2021"},
+        ]
+    )
+    for _, build_result in build_results_df.iterrows():
+        reasons = ", ".join(build_result["stale_inputs"])
+        if pd.notna(build_result["error"]):
+            print(
+                f"Failed {build_result['output_file_name']} ({reasons}): "
+                + build_result["error"]
+            )
+        elif build_result["rebuilt"]:
+            print(f"Rebuilt {build_result['output_file_name']} ({reasons})")
+        else:
+            print(f"Up to date: {build_result['output_file_name']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+import os
+import pickle
+from typing import Dict, List, Union, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from scipy.spatial import cKDTree
+
+from utils import get_project_root_dir, get_file_fingerprint
+from reprojection import reproject_gdf
+from census_extract import (
+    get_tiger_roads_in_county_file_path,
+    extract_tiger_roads_in_county,
+)
+from transpo_extract import (
+    extract_amtrak_stations,
+    extract_north_american_rail_nodes,
+)
+
+EARTH_RADIUS_METERS = 6_371_008.8
+# Vertices are indexed as points on the unit sphere, where straight-line (chord)
+# distance maps exactly to great-circle distance anywhere on the globe, so the North
+# American layers (Alaska, Canada) need no projection-specific tolerance.
+INDEX_VERSION = "unit_sphere_v1"
+# Lines are densified so no two consecutive vertices are farther apart than this,
+# bounding the overestimate of distance-to-nearest-vertex vs distance-to-line at half
+# of it.
+MAX_VERTEX_SPACING_M = 25.0
+METERS_PER_DEGREE_LAT = 111_320.0
+# Upper bound on query points * candidates held at once in query_k_nearest_facilities
+MAX_CANDIDATE_ELEMENTS = 20_000_000
+# Upper bound on vertex hits (python ints from query_ball_point) held at once in
+# query_facilities_within_radius
+MAX_RADIUS_VERTEX_HITS = 2_000_000
+
+NEAREST_FACILITY_LAYERS = {
+    "amtrak_stations": {
+        "file_name": "amtrak_stations.geojson",
+        "extract_func": extract_amtrak_stations,
+    },
+    "rail_nodes": {
+        "file_name": "north_american_rail_nodes.geojson",
+        "extract_func": extract_north_american_rail_nodes,
+    },
+}
+
+
+########################################################################################
+##################################### Index Build ######################################
+########################################################################################
+
+
+def lon_lat_to_unit_vectors(lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+    lons = np.radians(lons)
+    lats = np.radians(lats)
+    return np.column_stack(
+        [np.cos(lats) * np.cos(lons), np.cos(lats) * np.sin(lons), np.sin(lats)]
+    )
+
+
+def chord_to_great_circle_meters(chord_lengths: np.ndarray) -> np.ndarray:
+    return 2.0 * EARTH_RADIUS_METERS * np.arcsin(np.clip(chord_lengths / 2.0, 0.0, 1.0))
+
+
+def great_circle_meters_to_chord(distances_m: float) -> float:
+    return 2.0 * np.sin(min(distances_m / (2.0 * EARTH_RADIUS_METERS), np.pi / 2))
+
+
+def get_nearest_facility_index_file_path(
+    index_name: str, project_root_dir: os.path = get_project_root_dir()
+) -> os.path:
+    return os.path.join(
+        project_root_dir, "data_clean", "nearest_facility_indexes", f"{index_name}.pkl"
+    )
+
+
+def build_nearest_facility_index(
+    source_file_path: os.path,
+    index_name: str,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> Dict:
+    """Builds a KD-tree over the vertices of every feature in the source layer and
+    pickles it into data_clean/nearest_facility_indexes/.
+
+    Line and polygon features (eg road segments) are densified to vertices at most
+    MAX_VERTEX_SPACING_M apart before indexing, and each vertex maps back to the row of
+    the feature it came from.
+    """
+    facility_gdf = gpd.read_file(source_file_path)
+    facility_gdf = facility_gdf.loc[
+        facility_gdf["geometry"].notna() & ~facility_gdf["geometry"].is_empty
+    ]
+    facility_gdf = reproject_gdf(gdf=facility_gdf, target_crs="EPSG:4326")
+    # Spacing in degrees of latitude; a degree of longitude is never longer, so this
+    # is conservative east-west as well.
+    densified_geometries = shapely.segmentize(
+        facility_gdf["geometry"].values.to_numpy(),
+        max_segment_length=MAX_VERTEX_SPACING_M / METERS_PER_DEGREE_LAT,
+    )
+    coords, vertex_row_positions = shapely.get_coordinates(
+        densified_geometries, return_index=True
+    )
+
+    facility_index = {
+        "index_name": index_name,
+        "index_version": INDEX_VERSION,
+        "max_vertex_spacing_m": MAX_VERTEX_SPACING_M,
+        "source_file_path": source_file_path,
+        "source_fingerprint": get_file_fingerprint(source_file_path),
+        "tree": cKDTree(
+            lon_lat_to_unit_vectors(coords[:, 0], coords[:, 1]), balanced_tree=False
+        ),
+        "vertex_row_positions": vertex_row_positions,
+        "facility_ids": facility_gdf.index.values,
+    }
+    index_file_path = get_nearest_facility_index_file_path(
+        index_name=index_name, project_root_dir=project_root_dir
+    )
+    os.makedirs(os.path.dirname(index_file_path), exist_ok=True)
+    with open(index_file_path, "wb") as f:
+        pickle.dump(facility_index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return facility_index
+
+
+def load_nearest_facility_index(
+    source_file_path: os.path,
+    index_name: str,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> Dict:
+    """Returns the persisted index for the source layer, rebuilding it if the source
+    file has been re-extracted since the index was built."""
+    index_file_path = get_nearest_facility_index_file_path(
+        index_name=index_name, project_root_dir=project_root_dir
+    )
+    if os.path.isfile(index_file_path):
+        with open(index_file_path, "rb") as f:
+            facility_index = pickle.load(f)
+        if (
+            (facility_index["index_version"] == INDEX_VERSION)
+            and (facility_index["max_vertex_spacing_m"] == MAX_VERTEX_SPACING_M)
+            and (
+                facility_index["source_fingerprint"]
+                == get_file_fingerprint(source_file_path)
+            )
+        ):
+            return facility_index
+    return build_nearest_facility_index(
+        source_file_path=source_file_path,
+        index_name=index_name,
+        project_root_dir=project_root_dir,
+    )
+
+
+def load_nearest_facility_index_for_layer(
+    layer_name: str,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> Dict:
+    """Returns the index for one of the layers in NEAREST_FACILITY_LAYERS, pulling the
+    source data if it hasn't been extracted yet."""
+    assert layer_name in NEAREST_FACILITY_LAYERS.keys()
+    layer = NEAREST_FACILITY_LAYERS[layer_name]
+    source_file_path = os.path.join(project_root_dir, "data_raw", layer["file_name"])
+    if not os.path.isfile(source_file_path):
+        layer["extract_func"](project_root_dir=project_root_dir, return_df=False)
+    return load_nearest_facility_index(
+        source_file_path=source_file_path,
+        index_name=layer_name,
+        project_root_dir=project_root_dir,
+    )
+
+
+def load_nearest_facility_index_for_roads_in_county(
+    state_abrv: str,
+    county_name: str,
+    year: str,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> Dict:
+    source_file_path = get_tiger_roads_in_county_file_path(
+        state_abrv=state_abrv,
+        county_name=county_name,
+        year=year,
+        project_root_dir=project_root_dir,
+    )
+    if not os.path.isfile(source_file_path):
+        extract_tiger_roads_in_county(
+            state_abrv=state_abrv,
+            county_name=county_name,
+            year=year,
+            project_root_dir=project_root_dir,
+        )
+    index_name = os.path.splitext(os.path.basename(source_file_path))[0]
+    return load_nearest_facility_index(
+        source_file_path=source_file_path,
+        index_name=index_name,
+        project_root_dir=project_root_dir,
+    )
+
+
+########################################################################################
+####################################### Queries ########################################
+########################################################################################
+
+
+def collapse_candidates_to_facilities(
+    distances: np.ndarray, row_positions: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Keeps only the closest candidate vertex of each facility in every row of
+    (n_points, n_candidates) arrays by sorting on (row_position, distance) and
+    dropping repeats. Returns (distances, row_positions, n_distinct) with each row
+    ordered by distance and repeats pushed to the end as inf / -1."""
+    order = np.lexsort((distances, row_positions), axis=-1)
+    distances = np.take_along_axis(distances, order, axis=1)
+    row_positions = np.take_along_axis(row_positions, order, axis=1)
+    is_repeat = np.zeros(distances.shape, dtype=bool)
+    is_repeat[:, 1:] = row_positions[:, 1:] == row_positions[:, :-1]
+    distances[is_repeat] = np.inf
+    row_positions[is_repeat] = -1
+    order = np.argsort(distances, axis=1, kind="stable")
+    return (
+        np.take_along_axis(distances, order, axis=1),
+        np.take_along_axis(row_positions, order, axis=1),
+        (~is_repeat).sum(axis=1),
+    )
+
+
+def query_k_nearest_facilities(
+    facility_index: Dict,
+    lons: np.ndarray,
+    lats: np.ndarray,
+    k: int = 1,
+    candidate_mult: int = 4,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns (distances_m, facility_ids), each of shape (n_points, k), ordered by
+    great-circle distance.
+
+    The KD-tree returns k * candidate_mult candidate vertices per point, which are
+    collapsed to one per facility. Points with fewer than k distinct facilities among
+    their candidates (eg next to a long road with many vertices) are re-queried with
+    twice as many candidates until they have k or the tree is exhausted. Slots with no
+    facility (only when the layer has fewer than k) hold inf and a facility_id of -1.
+    """
+    tree = facility_index["tree"]
+    query_vectors = lon_lat_to_unit_vectors(
+        np.asarray(lons, dtype="float64"), np.asarray(lats, dtype="float64")
+    )
+    distances = np.full((len(query_vectors), k), np.inf)
+    row_positions = np.full((len(query_vectors), k), -1, dtype="int64")
+
+    pending = np.arange(len(query_vectors))
+    n_candidates = min(k * candidate_mult, tree.n)
+    while len(pending) > 0:
+        batch_size = max(1, MAX_CANDIDATE_ELEMENTS // n_candidates)
+        still_pending = []
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start : start + batch_size]
+            chord_lengths, vertex_ids = tree.query(
+                query_vectors[batch], k=n_candidates, workers=-1
+            )
+            chord_lengths = chord_lengths.reshape(len(batch), n_candidates)
+            vertex_ids = vertex_ids.reshape(len(batch), n_candidates)
+            batch_distances, batch_rows, n_distinct = collapse_candidates_to_facilities(
+                distances=chord_to_great_circle_meters(chord_lengths),
+                row_positions=facility_index["vertex_row_positions"][vertex_ids],
+            )
+            is_done = (n_distinct >= k) | (n_candidates == tree.n)
+            n_kept = min(k, n_candidates)
+            distances[batch[is_done], :n_kept] = batch_distances[is_done, :n_kept]
+            row_positions[batch[is_done], :n_kept] = batch_rows[is_done, :n_kept]
+            still_pending.append(batch[~is_done])
+        pending = np.concatenate(still_pending)
+        n_candidates = min(n_candidates * 2, tree.n)
+
+    facility_ids = np.where(
+        row_positions >= 0,
+        facility_index["facility_ids"][np.clip(row_positions, 0, None)],
+        -1,
+    )
+    return distances, facility_ids
+
+
+def get_radius_query_batch_edges(n_hits: np.ndarray, max_hits: int) -> np.ndarray:
+    """Edges of contiguous batches of query points with at most max_hits hits (or
+    query points) each; a point with more hits than that gets a batch of its own."""
+    cum_hits = np.concatenate([[0], np.cumsum(n_hits)])
+    batch_edges = [0]
+    while batch_edges[-1] < len(n_hits):
+        start = batch_edges[-1]
+        stop = np.searchsorted(cum_hits, cum_hits[start] + max_hits, side="right") - 1
+        batch_edges.append(min(max(stop, start + 1), start + max_hits, len(n_hits)))
+    return np.array(batch_edges)
+
+
+def query_facilities_within_radius(
+    facility_index: Dict,
+    lons: np.ndarray,
+    lats: np.ndarray,
+    radius_m: float,
+    max_vertex_hits: int = MAX_RADIUS_VERTEX_HITS,
+) -> pd.DataFrame:
+    """Returns a long DataFrame (query_index, facility_id, distance_m) with every
+    facility within radius_m (great-circle) of each query point.
+
+    Densified lines put many vertices within the radius of a point (hundreds for a
+    dense road grid), so hits are first counted, then fetched in batches of at most
+    max_vertex_hits vertices and collapsed to one per facility batch by batch.
+    """
+    tree = facility_index["tree"]
+    query_vectors = lon_lat_to_unit_vectors(
+        np.asarray(lons, dtype="float64"), np.asarray(lats, dtype="float64")
+    )
+    radius_chord = great_circle_meters_to_chord(radius_m)
+    n_hits = np.asarray(
+        tree.query_ball_point(
+            query_vectors, r=radius_chord, workers=-1, return_length=True
+        ),
+        dtype="int64",
+    ).reshape(-1)
+    batch_edges = get_radius_query_batch_edges(n_hits=n_hits, max_hits=max_vertex_hits)
+    hit_dfs = []
+    for start, stop in zip(batch_edges[:-1], batch_edges[1:]):
+        if n_hits[start:stop].sum() == 0:
+            continue
+        batch_vectors = query_vectors[start:stop]
+        vertex_id_lists = tree.query_ball_point(
+            batch_vectors, r=radius_chord, workers=-1, return_sorted=False
+        )
+        query_positions = np.repeat(np.arange(stop - start), n_hits[start:stop])
+        vertex_ids = np.concatenate(
+            [np.asarray(ids, dtype="int64") for ids in vertex_id_lists]
+        )
+        del vertex_id_lists
+        chord_lengths = np.linalg.norm(
+            batch_vectors[query_positions] - tree.data[vertex_ids], axis=1
+        )
+        hit_distances = chord_to_great_circle_meters(chord_lengths)
+        in_radius = hit_distances <= radius_m
+        batch_hits_df = pd.DataFrame(
+            {
+                "query_index": query_positions[in_radius] + start,
+                "row_position": facility_index["vertex_row_positions"][
+                    vertex_ids[in_radius]
+                ],
+                "distance_m": hit_distances[in_radius],
+            }
+        )
+        batch_hits_df = batch_hits_df.sort_values(by=["query_index", "distance_m"])
+        hit_dfs.append(
+            batch_hits_df.drop_duplicates(subset=["query_index", "row_position"])
+        )
+    if len(hit_dfs) == 0:
+        return pd.DataFrame(
+            {
+                "query_index": pd.Series(dtype="int64"),
+                "facility_id": pd.Series(dtype=facility_index["facility_ids"].dtype),
+                "distance_m": pd.Series(dtype="float64"),
+            }
+        )
+    # Batches are disjoint in query_index, so concatenating keeps them deduplicated
+    hits_df = pd.concat(hit_dfs, ignore_index=True)
+    hits_df["facility_id"] = facility_index["facility_ids"][
+        hits_df["row_position"].values
+    ]
+    hits_df = hits_df[["query_index", "facility_id", "distance_m"]]
+    hits_df = hits_df.reset_index(drop=True)
+    return hits_df
+
+
+def add_nearest_facility_to_gdf(
+    gdf: gpd.GeoDataFrame,
+    facility_index: Dict,
+    facility_label: str,
+) -> gpd.GeoDataFrame:
+    """Adds f"nearest_{facility_label}_id" and f"nearest_{facility_label}_distance_m"
+    columns, measured from each geometry's representative point (eg tract or road)."""
+    gdf = gdf.copy()
+    query_points = reproject_gdf(
+        gdf=gpd.GeoDataFrame(geometry=gdf["geometry"].representative_point()),
+        target_crs="EPSG:4326",
+    ).geometry
+    distances, facility_ids = query_k_nearest_facilities(
+        facility_index=facility_index,
+        lons=query_points.x.values,
+        lats=query_points.y.values,
+        k=1,
+    )
+    gdf[f"nearest_{facility_label}_id"] = facility_ids[:, 0]
+    gdf[f"nearest_{facility_label}_distance_m"] = distances[:, 0]
+    return gdf
@@ -0,0 +1,242 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Union, Optional, Tuple
+
+import numpy as np
+import geopandas as gpd
+import shapely
+import matplotlib.pyplot as plt
+from matplotlib.colors import to_rgb
+
+from utils import get_project_root_dir
+from reprojection import reproject_gdf
+
+RASTER_CRS = "EPSG:5070"  # Conus Albers, so a pixel covers the same area everywhere
+# Same classes and colors as plot_roads_by_feature_class_in_county_in_census_year
+ROAD_FEATURE_CLASS_GROUPS = {
+    "Private Road": {"mtfccs": ["S1740"], "color": "#8c510a"},
+    "Public Local Road": {"mtfccs": ["S1400"], "color": "#b7b7b9"},
+    "Secondary Road": {"mtfccs": ["S1200"], "color": "#ec1c24"},
+    "Primary Road": {"mtfccs": ["S1100", "S1630"], "color": "#59abdd"},
+}
+VERTICES_PER_CHUNK = 1_000_000
+PARALLEL_ACCUMULATION_MIN_ROWS = 100_000
+
+
+########################################################################################
+#################################### Accumulation ######################################
+########################################################################################
+
+
+def get_grid_shape(
+    bounds: Tuple[float, float, float, float], width_px: int
+) -> Tuple[int, int]:
+    min_x, min_y, max_x, max_y = bounds
+    height_px = max(1, int(round(width_px * (max_y - min_y) / (max_x - min_x))))
+    return height_px, width_px
+
+
+def get_line_coords(geometries: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns (coords, part_ids), the (n_vertices, 2) array of every vertex of the
+    (multi)lines and the index of the single line each vertex belongs to. Consecutive
+    vertices with the same part id form a segment."""
+    parts = shapely.get_parts(geometries)
+    return shapely.get_coordinates(parts, return_index=True)
+
+
+def accumulate_segment_lengths(
+    segments: np.ndarray,
+    bounds: Tuple[float, float, float, float],
+    grid_shape: Tuple[int, int],
+) -> np.ndarray:
+    """Splits each segment into pieces no longer than a pixel and adds each piece's
+    length to the pixel containing its midpoint."""
+    min_x, min_y, max_x, max_y = bounds
+    height_px, width_px = grid_shape
+    pixel_size = (max_x - min_x) / width_px
+    grid = np.zeros(height_px * width_px, dtype="float64")
+    if len(segments) == 0:
+        return grid.reshape(grid_shape)
+
+    dx = segments[:, 2] - segments[:, 0]
+    dy = segments[:, 3] - segments[:, 1]
+    segment_lengths = np.hypot(dx, dy)
+    n_pieces = np.maximum(1, np.ceil(segment_lengths / pixel_size)).astype("int64")
+    segment_ids = np.repeat(np.arange(len(segments)), n_pieces)
+    piece_starts = np.cumsum(n_pieces) - n_pieces
+    piece_ids = np.arange(len(segment_ids)) - np.repeat(piece_starts, n_pieces)
+    t = (piece_ids + 0.5) / n_pieces[segment_ids]
+    xs = segments[segment_ids, 0] + t * dx[segment_ids]
+    ys = segments[segment_ids, 1] + t * dy[segment_ids]
+
+    cols = np.floor((xs - min_x) / pixel_size).astype("int64")
+    rows = np.floor((max_y - ys) / pixel_size).astype("int64")
+    in_grid = (cols >= 0) & (cols < width_px) & (rows >= 0) & (rows < height_px)
+    grid += np.bincount(
+        rows[in_grid] * width_px + cols[in_grid],
+        weights=(segment_lengths / n_pieces)[segment_ids][in_grid],
+        minlength=height_px * width_px,
+    )
+    return grid.reshape(grid_shape)
+
+
+def accumulate_line_coords(
+    coords: np.ndarray,
+    part_ids: np.ndarray,
+    bounds: Tuple[float, float, float, float],
+    grid_shape: Tuple[int, int],
+) -> np.ndarray:
+    """Adds up the segments of get_line_coords output VERTICES_PER_CHUNK vertices at a
+    time into a single grid."""
+    grid = np.zeros(grid_shape, dtype="float64")
+    for start in range(0, max(len(coords) - 1, 0), VERTICES_PER_CHUNK):
+        # One vertex of overlap so the segment straddling the chunk edge is kept
+        stop = min(start + VERTICES_PER_CHUNK + 1, len(coords))
+        chunk_coords = coords[start:stop]
+        same_part = part_ids[start + 1 : stop] == part_ids[start : stop - 1]
+        segments = np.column_stack(
+            [chunk_coords[:-1][same_part], chunk_coords[1:][same_part]]
+        )
+        grid += accumulate_segment_lengths(
+            segments=segments, bounds=bounds, grid_shape=grid_shape
+        )
+    return grid
+
+
+def accumulate_line_length_grid(
+    geometries: np.ndarray,
+    bounds: Tuple[float, float, float, float],
+    grid_shape: Tuple[int, int],
+    n_workers: Optional[int] = None,
+) -> np.ndarray:
+    """Returns a grid of line length (in RASTER_CRS units, meters) per pixel for
+    (multi)line geometries already in RASTER_CRS.
+
+    For layers over PARALLEL_ACCUMULATION_MIN_ROWS rows and more than one worker
+    (n_workers defaults to os.cpu_count()), the geometries are split into one
+    contiguous slice per worker, and each worker is sent its slice's vertices as
+    plain numpy arrays (shapely geometries are slow to pickle). Each worker returns a
+    single grid, so memory is bounded by the layer's vertices plus n_workers + 1
+    grids.
+    """
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    if (len(geometries) <= PARALLEL_ACCUMULATION_MIN_ROWS) or (n_workers == 1):
+        coords, part_ids = get_line_coords(geometries)
+        return accumulate_line_coords(coords, part_ids, bounds, grid_shape)
+
+    slice_edges = np.linspace(0, len(geometries), n_workers + 1).astype("int64")
+    grid = np.zeros(grid_shape, dtype="float64")
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = [
+            executor.submit(
+                accumulate_line_coords,
+                *get_line_coords(geometries[start:stop]),
+                bounds,
+                grid_shape,
+            )
+            for start, stop in zip(slice_edges[:-1], slice_edges[1:])
+        ]
+        for future in as_completed(futures):
+            grid += future.result()
+    return grid
+
+
+def accumulate_line_length_grids_by_class(
+    gdf: gpd.GeoDataFrame,
+    width_px: int = 4_000,
+    class_column: str = "MTFCC",
+    class_groups: Dict[str, Dict] = ROAD_FEATURE_CLASS_GROUPS,
+    bounds: Optional[Tuple[float, float, float, float]] = None,
+    n_workers: Optional[int] = None,
+) -> Tuple[Dict[str, np.ndarray], Tuple[float, float, float, float]]:
+    """Returns ({class_label: grid}, bounds) with one grid per class group, eg per
+    group of MTFCC codes for roads."""
+    gdf = reproject_gdf(gdf=gdf, target_crs=RASTER_CRS)
+    if bounds is None:
+        bounds = tuple(gdf.total_bounds)
+    grid_shape = get_grid_shape(bounds=bounds, width_px=width_px)
+    geometries = gdf.geometry.values.to_numpy()
+    class_grids = {}
+    for class_label, class_group in class_groups.items():
+        class_grids[class_label] = accumulate_line_length_grid(
+            geometries=geometries[gdf[class_column].isin(class_group["mtfccs"]).values],
+            bounds=bounds,
+            grid_shape=grid_shape,
+            n_workers=n_workers,
+        )
+    return class_grids, bounds
+
+
+########################################################################################
+####################################### Shading ########################################
+########################################################################################
+
+
+def normalize_grid(grid: np.ndarray, clip_pct: float = 99.5) -> np.ndarray:
+    """Log-scales the grid to [0, 1], clipping at the clip_pct percentile of nonzero
+    pixels so a few dense interchanges don't wash out the rest of the map."""
+    log_grid = np.log1p(grid)
+    nonzero = log_grid[log_grid > 0]
+    if len(nonzero) == 0:
+        return log_grid
+    return np.clip(log_grid / np.percentile(nonzero, clip_pct), 0.0, 1.0)
+
+
+def write_density_png(
+    grid: np.ndarray,
+    output_file_path: os.path,
+    cmap: str = "magma",
+) -> None:
+    os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
+    plt.imsave(output_file_path, normalize_grid(grid), cmap=cmap, vmin=0.0, vmax=1.0)
+
+
+def write_class_density_png(
+    class_grids: Dict[str, np.ndarray],
+    output_file_path: os.path,
+    class_groups: Dict[str, Dict] = ROAD_FEATURE_CLASS_GROUPS,
+    background_color: str = "white",
+) -> None:
+    """Blends each class's grid into one image in the class's color; later classes in
+    class_groups are drawn over earlier ones, matching the vector road maps."""
+    height_px, width_px = next(iter(class_grids.values())).shape
+    image = np.ones((height_px, width_px, 3)) * np.array(to_rgb(background_color))
+    for class_label, class_grid in class_grids.items():
+        alpha = normalize_grid(class_grid)[:, :, None]
+        color = np.array(to_rgb(class_groups[class_label]["color"]))
+        image = image * (1.0 - alpha) + color * alpha
+    os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
+    plt.imsave(output_file_path, (image * 255).astype("uint8"))
+
+
+def render_road_density_map(
+    roads_gdf: gpd.GeoDataFrame,
+    output_file_name: str,
+    width_px: int = 4_000,
+    by_feature_class: bool = True,
+    cmap: str = "magma",
+    n_workers: Optional[int] = None,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> os.path:
+    """Rasterizes roads (or any line layer, eg rail lines with by_feature_class=False)
+    into output/<output_file_name> without drawing individual lines."""
+    output_file_path = os.path.join(project_root_dir, "output", output_file_name)
+    if by_feature_class:
+        class_grids, _ = accumulate_line_length_grids_by_class(
+            gdf=roads_gdf, width_px=width_px, n_workers=n_workers
+        )
+        write_class_density_png(
+            class_grids=class_grids, output_file_path=output_file_path
+        )
+    else:
+        roads_gdf = reproject_gdf(gdf=roads_gdf, target_crs=RASTER_CRS)
+        bounds = tuple(roads_gdf.total_bounds)
+        grid = accumulate_line_length_grid(
+            geometries=roads_gdf.geometry.values.to_numpy(),
+            bounds=bounds,
+            grid_shape=get_grid_shape(bounds=bounds, width_px=width_px),
+            n_workers=n_workers,
+        )
+        write_density_png(grid=grid, output_file_path=output_file_path, cmap=cmap)
+    return output_file_path
@@ -0,0 +1,290 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Union, Optional
+from urllib.request import urlopen
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+RAW_DATA_CACHE_ENV_VAR = "THIS_LAND_RAW_DATA_CACHE"
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+MIRROR_TIMEOUT_SECONDS = 30
+FICLONE = 0x40049409  # Linux ioctl for reflinks (btrfs, xfs)
+
+
+########################################################################################
+#################################### Cache Layout ######################################
+########################################################################################
+
+# <cache_root>/
+#     blobs/<sha256[:2]>/<sha256>    read-only file content, named by its hash
+#     manifest/<sha256(url)>.json    {"url", "sha256", "size", "generation",
+#                                     "fetched_at"}
+#     locks/<sha256(url)>.lock       serializes upstream fetches of the same url
+#
+# A cache root can be a directory on a shared filesystem or the http(s) url of a
+# static mirror of one (eg `python -m http.server` run in the cache root), which is
+# treated as read-only.
+
+
+def get_raw_data_cache_location() -> Optional[str]:
+    return os.environ.get(RAW_DATA_CACHE_ENV_VAR)
+
+
+def is_http_mirror(cache_location: str) -> bool:
+    return cache_location.startswith("http://") or cache_location.startswith("https://")
+
+
+def get_url_key(url: str) -> str:
+    return hashlib.sha256(url.encode()).hexdigest()
+
+
+def get_blob_relative_path(sha256: str) -> str:
+    return "/".join(["blobs", sha256[:2], sha256])
+
+
+def get_manifest_relative_path(url: str) -> str:
+    return "/".join(["manifest", f"{get_url_key(url)}.json"])
+
+
+def get_blob_path(cache_root: os.path, sha256: str) -> os.path:
+    return os.path.join(cache_root, *get_blob_relative_path(sha256).split("/"))
+
+
+def write_file_atomically(file_path: os.path, data: bytes) -> None:
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    tmp_file_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(tmp_file_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_file_path, file_path)
+
+
+def remove_file_if_exists(file_path: os.path) -> None:
+    if os.path.lexists(file_path):
+        os.remove(file_path)
+
+
+@contextmanager
+def url_lock(cache_root: os.path, url: str):
+    lock_file_path = os.path.join(cache_root, "locks", f"{get_url_key(url)}.lock")
+    os.makedirs(os.path.dirname(lock_file_path), exist_ok=True)
+    with open(lock_file_path, "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+########################################################################################
+################################## Manifest and Blobs ##################################
+########################################################################################
+
+
+def read_manifest_entry(cache_location: str, url: str) -> Optional[Dict]:
+    manifest_path = get_manifest_relative_path(url)
+    if is_http_mirror(cache_location):
+        try:
+            with urlopen(
+                f"{cache_location.rstrip('/')}/{manifest_path}",
+                timeout=MIRROR_TIMEOUT_SECONDS,
+            ) as response:
+                return json.loads(response.read())
+        except (OSError, ValueError):  # missing, unreachable, timed out or garbled
+            return None
+    file_path = os.path.join(cache_location, *manifest_path.split("/"))
+    if not os.path.isfile(file_path):
+        return None
+    with open(file_path, "r") as f:
+        return json.load(f)
+
+
+def get_manifest_generation(manifest_entry: Optional[Dict]) -> int:
+    """Count of upstream fetches recorded for the url; 0 if it was never fetched."""
+    if manifest_entry is None:
+        return 0
+    return manifest_entry.get("generation", 1)
+
+
+def stream_url_to_file(
+    url: str, file_path: os.path, timeout: Optional[float] = None
+) -> Dict:
+    """Streams url to file_path, hashing as it goes. Returns {"sha256", "size"}."""
+    sha256 = hashlib.sha256()
+    size = 0
+    with urlopen(url, timeout=timeout) as response, open(file_path, "wb") as f:
+        while True:
+            data = response.read(DOWNLOAD_CHUNK_SIZE)
+            if len(data) == 0:
+                break
+            sha256.update(data)
+            size += len(data)
+            f.write(data)
+    return {"sha256": sha256.hexdigest(), "size": size}
+
+
+def download_url_to_blob(cache_root: os.path, url: str, generation: int) -> Dict:
+    """Downloads url into the blob store and records it in the manifest as the given
+    generation. Returns the new manifest entry."""
+    tmp_dir = os.path.join(cache_root, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp_file_path = os.path.join(tmp_dir, f"{get_url_key(url)}.{os.getpid()}.tmp")
+    try:
+        download = stream_url_to_file(url=url, file_path=tmp_file_path)
+        sha256 = download["sha256"]
+        blob_path = get_blob_path(cache_root=cache_root, sha256=sha256)
+        if not os.path.isfile(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            os.chmod(tmp_file_path, 0o444)
+            os.replace(tmp_file_path, blob_path)
+    finally:
+        remove_file_if_exists(tmp_file_path)
+
+    manifest_entry = {
+        "url": url,
+        "sha256": sha256,
+        "size": download["size"],
+        "generation": generation,
+        "fetched_at": time.time(),
+    }
+    write_file_atomically(
+        os.path.join(cache_root, *get_manifest_relative_path(url).split("/")),
+        json.dumps(manifest_entry, indent=2).encode(),
+    )
+    return manifest_entry
+
+
+def is_blob_cached(cache_root: os.path, manifest_entry: Optional[Dict]) -> bool:
+    """False if url was never fetched or its blob has since been pruned."""
+    return (manifest_entry is not None) and os.path.isfile(
+        get_blob_path(cache_root=cache_root, sha256=manifest_entry["sha256"])
+    )
+
+
+def fetch_url_into_cache(
+    cache_root: os.path, url: str, force_repull: bool = False
+) -> Dict:
+    """Returns the manifest entry for url, fetching it from upstream only if no other
+    worker has. With force_repull, an entry whose generation moved on while this call
+    waited for the lock was fetched by another worker after this call started, so it
+    counts as fresh and a fleet-wide refresh downloads each url once. Generations
+    rather than timestamps are compared since workers' clocks can disagree. An entry
+    whose blob was pruned counts as a miss."""
+    manifest_entry = read_manifest_entry(cache_root, url)
+    if is_blob_cached(cache_root, manifest_entry) and not force_repull:
+        return manifest_entry
+    requested_generation = get_manifest_generation(manifest_entry)
+    with url_lock(cache_root=cache_root, url=url):
+        manifest_entry = read_manifest_entry(cache_root, url)
+        generation = get_manifest_generation(manifest_entry)
+        if is_blob_cached(cache_root, manifest_entry) and (
+            not force_repull or generation != requested_generation
+        ):
+            return manifest_entry
+        return download_url_to_blob(
+            cache_root=cache_root, url=url, generation=generation + 1
+        )
+
+
+########################################################################################
+################################### Materialization ####################################
+########################################################################################
+
+
+def reflink_file(source_file_path: os.path, file_path: os.path) -> None:
+    if fcntl is None:
+        raise OSError("reflinks aren't supported on this platform")
+    with open(source_file_path, "rb") as src, open(file_path, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def materialize_blob(blob_path: os.path, file_path: os.path) -> None:
+    """Places the blob at file_path as a hardlink, falling back to a reflink and then
+    a plain copy (eg when data_raw/ is on a different filesystem than the cache).
+    The file is swapped in with os.replace so readers never see a partial file."""
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    tmp_file_path = f"{file_path}.{os.getpid()}.tmp"
+    remove_file_if_exists(tmp_file_path)
+    try:
+        try:
+            os.link(blob_path, tmp_file_path)
+        except OSError:
+            try:
+                reflink_file(blob_path, tmp_file_path)
+            except OSError:
+                shutil.copyfile(blob_path, tmp_file_path)
+        os.replace(tmp_file_path, file_path)
+    finally:
+        remove_file_if_exists(tmp_file_path)
+
+
+def download_blob_from_mirror(
+    mirror_url: str, manifest_entry: Dict, file_path: os.path
+) -> None:
+    blob_relative_path = get_blob_relative_path(manifest_entry["sha256"])
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    tmp_file_path = f"{file_path}.{os.getpid()}.tmp"
+    try:
+        download = stream_url_to_file(
+            url=f"{mirror_url.rstrip('/')}/{blob_relative_path}",
+            file_path=tmp_file_path,
+            timeout=MIRROR_TIMEOUT_SECONDS,
+        )
+        if download["sha256"] != manifest_entry["sha256"]:
+            raise ValueError(f"Corrupt blob from mirror for {manifest_entry['url']}")
+        os.replace(tmp_file_path, file_path)
+    finally:
+        remove_file_if_exists(tmp_file_path)
+
+
+def download_url_from_upstream(url: str, file_path: os.path) -> None:
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    tmp_file_path = f"{file_path}.{os.getpid()}.tmp"
+    try:
+        stream_url_to_file(url=url, file_path=tmp_file_path)
+        os.replace(tmp_file_path, file_path)
+    finally:
+        remove_file_if_exists(tmp_file_path)
+
+
+def retrieve_url_via_cache(
+    url: str,
+    file_path: os.path,
+    force_repull: bool = False,
+    cache_location: Optional[str] = None,
+) -> None:
+    """Drop-in for urlretrieve(url, file_path) that goes through the content-addressed
+    cache at cache_location (defaults to the THIS_LAND_RAW_DATA_CACHE env var). An http
+    mirror is read-only, so urls it doesn't have (or can't serve) are pulled straight
+    from upstream."""
+    if cache_location is None:
+        cache_location = get_raw_data_cache_location()
+    if is_http_mirror(cache_location):
+        manifest_entry = read_manifest_entry(cache_location, url)
+        if (manifest_entry is not None) and not force_repull:
+            try:
+                download_blob_from_mirror(
+                    mirror_url=cache_location,
+                    manifest_entry=manifest_entry,
+                    file_path=file_path,
+                )
+                return
+            except (OSError, ValueError):
+                pass
+        download_url_from_upstream(url=url, file_path=file_path)
+        return
+    manifest_entry = fetch_url_into_cache(
+        cache_root=cache_location, url=url, force_repull=force_repull
+    )
+    blob_path = get_blob_path(
+        cache_root=cache_location, sha256=manifest_entry["sha256"]
+    )
+    materialize_blob(blob_path=blob_path, file_path=file_path)
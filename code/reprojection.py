@@ -0,0 +1,177 @@
+import hashlib
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, Union, Optional
+
+import numpy as np
+import geopandas as gpd
+import shapely
+from pyproj import CRS, Transformer
+
+from utils import get_project_root_dir, get_file_fingerprint
+
+NAMED_CRSS = {
+    "native": "EPSG:4269",  # NAD83, what TIGER ships in
+    "wgs84": "EPSG:4326",
+    "conus_equal_area": "EPSG:5070",  # NAD83 / Conus Albers
+}
+
+
+########################################################################################
+#################################### Transformers ######################################
+########################################################################################
+
+
+def resolve_crs(crs: Union[str, int, CRS]) -> str:
+    """Maps NAMED_CRSS keys, EPSG codes and CRS objects to an "AUTHORITY:CODE" string
+    (or WKT when the CRS has no authority code)."""
+    if isinstance(crs, str) and crs in NAMED_CRSS.keys():
+        crs = NAMED_CRSS[crs]
+    crs = CRS.from_user_input(crs)
+    authority = crs.to_authority()
+    if authority is not None:
+        return ":".join(authority)
+    return crs.to_wkt()
+
+
+def get_crs_cache_key(crs: Union[str, int, CRS]) -> str:
+    crs = resolve_crs(crs)
+    if len(crs) > 40:
+        return f"crs_{hashlib.sha1(crs.encode()).hexdigest()[:12]}"
+    return re.sub(r"[^0-9a-z]+", "_", crs.lower())
+
+
+@lru_cache(maxsize=None)
+def get_transformer(source_crs: str, target_crs: str) -> Transformer:
+    """Transformers are expensive to build, so there's one per (source, target) pair
+    per process."""
+    return Transformer.from_crs(source_crs, target_crs, always_xy=True)
+
+
+########################################################################################
+##################################### Reprojection #####################################
+########################################################################################
+
+
+def reproject_geometries(
+    geometries: np.ndarray, source_crs: str, target_crs: str
+) -> np.ndarray:
+    """Reprojects the flat array of every vertex in one vectorized Transformer call
+    (one more for any geometries with Z, whose Z is transformed and kept as in
+    to_crs) and writes the vertices back into copies of the geometries."""
+    transformer = get_transformer(source_crs=source_crs, target_crs=target_crs)
+    reprojected = geometries.copy()
+    has_z = shapely.has_z(geometries)
+    for include_z in [False, True]:
+        is_selected = has_z == include_z
+        if not is_selected.any():
+            continue
+        selected = geometries[is_selected]
+        coords = shapely.get_coordinates(selected, include_z=include_z)
+        reprojected_coords = np.column_stack(transformer.transform(*coords.T))
+        reprojected[is_selected] = shapely.set_coordinates(
+            selected.copy(), reprojected_coords
+        )
+    return reprojected
+
+
+def reproject_gdf(
+    gdf: gpd.GeoDataFrame, target_crs: Union[str, int, CRS]
+) -> gpd.GeoDataFrame:
+    """Drop-in replacement for gdf.to_crs(target_crs) that reuses cached transformers.
+    Unlike to_crs, a gdf already in target_crs is returned as is rather than copied,
+    so treat the result as read-only or copy it yourself."""
+    assert gdf.crs is not None
+    source_crs = resolve_crs(gdf.crs)
+    target_crs = resolve_crs(target_crs)
+    if source_crs == target_crs:
+        return gdf
+
+    reprojected = reproject_geometries(
+        geometries=gdf.geometry.values.to_numpy(),
+        source_crs=source_crs,
+        target_crs=target_crs,
+    )
+    gdf = gdf.set_geometry(
+        gpd.GeoSeries(reprojected, index=gdf.index, crs=target_crs),
+        crs=target_crs,
+    )
+    return gdf
+
+
+########################################################################################
+######################################## Cache #########################################
+########################################################################################
+
+
+def get_reprojected_layer_file_path(
+    layer_name: str,
+    source_fingerprint: str,
+    target_crs: Union[str, int, CRS],
+    project_root_dir: os.path = get_project_root_dir(),
+) -> os.path:
+    crs_key = get_crs_cache_key(target_crs)
+    return os.path.join(
+        project_root_dir,
+        "data_clean",
+        "reprojected",
+        layer_name,
+        f"{layer_name}_{source_fingerprint}_{crs_key}.parquet",
+    )
+
+
+def load_reprojected_layer(
+    source_file_path: os.path,
+    target_crs: Union[str, int, CRS],
+    layer_name: Optional[str] = None,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> gpd.GeoDataFrame:
+    """Returns the layer in source_file_path reprojected to target_crs (a NAMED_CRSS
+    key, or any CRS such as a state plane zone, eg "EPSG:2253" for Michigan South ft).
+
+    Reprojected variants are cached as GeoParquet under
+    data_clean/reprojected/<layer_name>/, keyed by the source file fingerprint and the
+    target CRS, so re-extracting the source invalidates its cached variants.
+    """
+    if layer_name is None:
+        layer_name = os.path.basename(source_file_path).split(".")[0]
+    file_path = get_reprojected_layer_file_path(
+        layer_name=layer_name,
+        source_fingerprint=get_file_fingerprint(source_file_path),
+        target_crs=target_crs,
+        project_root_dir=project_root_dir,
+    )
+    if os.path.isfile(file_path):
+        return gpd.read_parquet(file_path)
+
+    layer_dir = os.path.dirname(file_path)
+    os.makedirs(layer_dir, exist_ok=True)
+    crs_key = get_crs_cache_key(target_crs)
+    for stale_file_name in os.listdir(layer_dir):
+        if stale_file_name.endswith(f"_{crs_key}.parquet"):
+            os.remove(os.path.join(layer_dir, stale_file_name))
+
+    gdf = reproject_gdf(gdf=gpd.read_file(source_file_path), target_crs=target_crs)
+    tmp_file_path = f"{file_path}.{os.getpid()}.tmp"
+    gdf.to_parquet(tmp_file_path)
+    os.replace(tmp_file_path, file_path)
+    return gdf
+
+
+def cache_reprojected_variants_of_layer(
+    source_file_path: os.path,
+    target_crss: Optional[List[Union[str, int, CRS]]] = None,
+    layer_name: Optional[str] = None,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> None:
+    """Caches the layer in each CRS in target_crss (defaults to all NAMED_CRSS)."""
+    if target_crss is None:
+        target_crss = list(NAMED_CRSS.keys())
+    for target_crs in target_crss:
+        load_reprojected_layer(
+            source_file_path=source_file_path,
+            target_crs=target_crs,
+            layer_name=layer_name,
+            project_root_dir=project_root_dir,
+        )
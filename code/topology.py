@@ -0,0 +1,416 @@
+import os
+import time
+from typing import Dict, List, Union, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from utils import get_project_root_dir, get_file_fingerprint
+from census_extract import (
+    get_tiger_county_area_hyrography_relationships_file_path,
+    get_tiger_topological_faces_in_county_file_path,
+    get_tiger_topological_edges_in_county_file_path,
+    extract_tiger_county_area_hyrography_relationships_for_year,
+    extract_tiger_topological_faces_in_county,
+    extract_tiger_topological_edges_in_county,
+    load_tiger_county_area_hyrography_relationships_for_year,
+    load_tiger_topological_faces_in_county,
+    load_tiger_topological_edges_in_county,
+    load_tiger_area_water_in_county,
+)
+from reprojection import reproject_gdf
+
+# TIGER suffixes geocode columns in FACES with the census they come from (eg TRACTCE20)
+FACES_GEOCODE_VINTAGE_SUFFIXES = ["20", "10", ""]
+
+
+########################################################################################
+################################### Adjacency Arrays ###################################
+########################################################################################
+
+
+def build_csr(
+    row_ids: np.ndarray, col_ids: np.ndarray, n_rows: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns (indptr, indices) so that the cols of row r are
+    indices[indptr[r] : indptr[r + 1]]. Pairs with a -1 on either side are dropped."""
+    is_valid = (row_ids >= 0) & (col_ids >= 0)
+    row_ids = row_ids[is_valid]
+    col_ids = col_ids[is_valid]
+    order = np.argsort(row_ids, kind="stable")
+    indptr = np.zeros(n_rows + 1, dtype="int64")
+    indptr[1:] = np.cumsum(np.bincount(row_ids, minlength=n_rows))
+    return indptr, col_ids[order]
+
+
+def get_csr_rows(
+    indptr: np.ndarray, indices: np.ndarray, row_ids: Union[int, np.ndarray]
+) -> np.ndarray:
+    """Concatenated cols of all of the rows in row_ids, without a python loop."""
+    row_ids = np.atleast_1d(row_ids)
+    starts = indptr[row_ids]
+    lengths = indptr[row_ids + 1] - starts
+    offsets = np.cumsum(lengths) - lengths
+    positions = np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+    return indices[positions]
+
+
+def lookup_face_ids(face_tfids: np.ndarray, tfids: np.ndarray) -> np.ndarray:
+    """Maps TFIDs to face ids (positions in the sorted face_tfids), -1 if absent."""
+    positions = np.searchsorted(face_tfids, tfids)
+    positions = np.clip(positions, 0, len(face_tfids) - 1)
+    return np.where(face_tfids[positions] == tfids, positions, -1)
+
+
+def get_faces_geocode_suffix(faces_columns: List[str]) -> str:
+    for suffix in FACES_GEOCODE_VINTAGE_SUFFIXES:
+        if f"TRACTCE{suffix}" in faces_columns:
+            return suffix
+    raise ValueError("FACES layer has no TRACTCE column")
+
+
+def build_county_topology(
+    faces_gdf: gpd.GeoDataFrame,
+    edges_gdf: gpd.GeoDataFrame,
+    facesah_df: pd.DataFrame,
+) -> Dict[str, np.ndarray]:
+    """Builds integer-keyed face<->edge<->hydrography adjacency from TIGER FACES, EDGES
+    and FACESAH. Face ids are positions in the sorted face_tfids array, edge ids are
+    row positions in edges_gdf, and hydro ids are positions in hydro_ids."""
+    face_tfids = np.sort(faces_gdf["TFID"].astype("int64").values)
+    faces_gdf = faces_gdf.set_index(faces_gdf["TFID"].astype("int64")).loc[face_tfids]
+    n_faces = len(face_tfids)
+
+    suffix = get_faces_geocode_suffix(list(faces_gdf.columns))
+    face_tract_geoids = (
+        faces_gdf[f"STATEFP{suffix}"]
+        + faces_gdf[f"COUNTYFP{suffix}"]
+        + faces_gdf[f"TRACTCE{suffix}"]
+    )
+    face_tract_codes, tract_geoids = pd.factorize(face_tract_geoids)
+
+    edge_left_faces = lookup_face_ids(
+        face_tfids, edges_gdf["TFIDL"].fillna(-1).astype("int64").values
+    )
+    edge_right_faces = lookup_face_ids(
+        face_tfids, edges_gdf["TFIDR"].fillna(-1).astype("int64").values
+    )
+    edge_ids = np.arange(len(edges_gdf))
+    face_edges_indptr, face_edges_indices = build_csr(
+        row_ids=np.concatenate([edge_left_faces, edge_right_faces]),
+        col_ids=np.concatenate([edge_ids, edge_ids]),
+        n_rows=n_faces,
+    )
+
+    facesah_faces = lookup_face_ids(
+        face_tfids, facesah_df["TFID"].astype("int64").values
+    )
+    facesah_hydro_codes, hydro_ids = pd.factorize(facesah_df["HYDROID"].astype(str))
+    face_hydro_indptr, face_hydro_indices = build_csr(
+        row_ids=facesah_faces, col_ids=facesah_hydro_codes, n_rows=n_faces
+    )
+    hydro_faces_indptr, hydro_faces_indices = build_csr(
+        row_ids=facesah_hydro_codes, col_ids=facesah_faces, n_rows=len(hydro_ids)
+    )
+    face_is_water = np.diff(face_hydro_indptr) > 0
+
+    return {
+        "face_tfids": face_tfids,
+        "face_tract_codes": face_tract_codes,
+        "tract_geoids": np.asarray(tract_geoids, dtype=str),
+        "face_is_water": face_is_water,
+        "edge_tlids": edges_gdf["TLID"].astype("int64").values,
+        "edge_left_faces": edge_left_faces,
+        "edge_right_faces": edge_right_faces,
+        "face_edges_indptr": face_edges_indptr,
+        "face_edges_indices": face_edges_indices,
+        "hydro_ids": np.asarray(hydro_ids, dtype=str),
+        "face_hydro_indptr": face_hydro_indptr,
+        "face_hydro_indices": face_hydro_indices,
+        "hydro_faces_indptr": hydro_faces_indptr,
+        "hydro_faces_indices": hydro_faces_indices,
+    }
+
+
+def get_county_topology_file_path(
+    state_abrv: str,
+    county_name: str,
+    year: str,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> os.path:
+    file_name = f"topology_of_{county_name.lower().replace(' ', '_')}_county_{state_abrv.upper()}_{year}.npz"
+    return os.path.join(project_root_dir, "data_clean", "topology", file_name)
+
+
+def get_county_topology_source_fingerprints(
+    state_abrv: str,
+    county_name: str,
+    year: str,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> np.ndarray:
+    """Fingerprints of the county's FACES, EDGES and FACESAH zips (in that order),
+    pulling any that haven't been extracted yet."""
+    county_kwargs = {
+        "state_abrv": state_abrv,
+        "county_name": county_name,
+        "year": year,
+        "project_root_dir": project_root_dir,
+    }
+    source_files = [
+        (
+            get_tiger_topological_faces_in_county_file_path,
+            extract_tiger_topological_faces_in_county,
+        ),
+        (
+            get_tiger_topological_edges_in_county_file_path,
+            extract_tiger_topological_edges_in_county,
+        ),
+        (
+            get_tiger_county_area_hyrography_relationships_file_path,
+            extract_tiger_county_area_hyrography_relationships_for_year,
+        ),
+    ]
+    source_fingerprints = []
+    for get_file_path_func, extract_func in source_files:
+        file_path = get_file_path_func(**county_kwargs)
+        if not os.path.isfile(file_path):
+            extract_func(**county_kwargs)
+        source_fingerprints.append(get_file_fingerprint(file_path))
+    return np.array(source_fingerprints, dtype=str)
+
+
+def load_county_topology(
+    state_abrv: str,
+    county_name: str,
+    year: str,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> Dict[str, np.ndarray]:
+    """Returns the county's topology arrays, building them from the TIGER FACES, EDGES
+    and FACESAH files (and caching them as an .npz) on first use. The .npz records the
+    fingerprints of the files it was built from and is rebuilt if any of them were
+    re-extracted, as edge ids are row positions in that exact EDGES file."""
+    county_kwargs = {
+        "state_abrv": state_abrv,
+        "county_name": county_name,
+        "year": year,
+        "project_root_dir": project_root_dir,
+    }
+    file_path = get_county_topology_file_path(**county_kwargs)
+    source_fingerprints = get_county_topology_source_fingerprints(**county_kwargs)
+    if os.path.isfile(file_path):
+        with np.load(file_path) as topology_npz:
+            topology = {key: topology_npz[key] for key in topology_npz.files}
+        if np.array_equal(
+            topology.pop("source_fingerprints", np.array([], dtype=str)),
+            source_fingerprints,
+        ):
+            return topology
+
+    topology = build_county_topology(
+        faces_gdf=load_tiger_topological_faces_in_county(**county_kwargs),
+        edges_gdf=load_tiger_topological_edges_in_county(**county_kwargs),
+        facesah_df=load_tiger_county_area_hyrography_relationships_for_year(
+            **county_kwargs
+        ),
+    )
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    np.savez_compressed(file_path, source_fingerprints=source_fingerprints, **topology)
+    return topology
+
+
+########################################################################################
+####################################### Queries ########################################
+########################################################################################
+
+
+def get_water_face_tfids(topology: Dict[str, np.ndarray]) -> np.ndarray:
+    return topology["face_tfids"][topology["face_is_water"]]
+
+
+def get_neighboring_face_ids(
+    topology: Dict[str, np.ndarray], face_ids: Union[int, np.ndarray]
+) -> np.ndarray:
+    """Faces sharing an edge with any of face_ids (excluding face_ids themselves)."""
+    face_ids = np.atleast_1d(face_ids)
+    edge_ids = get_csr_rows(
+        topology["face_edges_indptr"], topology["face_edges_indices"], face_ids
+    )
+    neighbor_ids = np.concatenate(
+        [topology["edge_left_faces"][edge_ids], topology["edge_right_faces"][edge_ids]]
+    )
+    neighbor_ids = np.unique(neighbor_ids[neighbor_ids >= 0])
+    return np.setdiff1d(neighbor_ids, face_ids, assume_unique=True)
+
+
+def get_tracts_bordering_hydro_feature(
+    topology: Dict[str, np.ndarray], hydro_id: str
+) -> np.ndarray:
+    """GEOIDs of tracts with a land face sharing an edge with the hydro feature (eg a
+    lake) identified by its TIGER HYDROID."""
+    hydro_code = np.flatnonzero(topology["hydro_ids"] == hydro_id)
+    if len(hydro_code) == 0:
+        return np.array([], dtype=str)
+    hydro_face_ids = get_csr_rows(
+        topology["hydro_faces_indptr"], topology["hydro_faces_indices"], hydro_code
+    )
+    neighbor_ids = get_neighboring_face_ids(topology, hydro_face_ids)
+    neighbor_ids = neighbor_ids[~topology["face_is_water"][neighbor_ids]]
+    tract_codes = np.unique(topology["face_tract_codes"][neighbor_ids])
+    return topology["tract_geoids"][tract_codes[tract_codes >= 0]]
+
+
+def get_dissolve_boundary_edge_ids(
+    topology: Dict[str, np.ndarray], face_mask: np.ndarray
+) -> np.ndarray:
+    """Edge ids on the outline of the union of the faces in face_mask, ie edges with
+    the mask on exactly one side. This is a dissolve without any geometry ops."""
+    left_faces = topology["edge_left_faces"]
+    right_faces = topology["edge_right_faces"]
+    left_in = np.where(left_faces >= 0, face_mask[np.clip(left_faces, 0, None)], False)
+    right_in = np.where(
+        right_faces >= 0, face_mask[np.clip(right_faces, 0, None)], False
+    )
+    return np.flatnonzero(left_in != right_in)
+
+
+def get_tract_boundary_edge_ids(
+    topology: Dict[str, np.ndarray], tract_geoid: str, land_only: bool = False
+) -> np.ndarray:
+    face_mask = topology["face_tract_codes"] == np.flatnonzero(
+        topology["tract_geoids"] == tract_geoid
+    )[0]
+    if land_only:
+        face_mask = face_mask & ~topology["face_is_water"]
+    return get_dissolve_boundary_edge_ids(topology, face_mask)
+
+
+def dissolve_faces_to_boundary_lines(
+    edges_gdf: gpd.GeoDataFrame,
+    topology: Dict[str, np.ndarray],
+    face_mask: np.ndarray,
+) -> shapely.Geometry:
+    """Outline of the faces in face_mask built only from the EDGES geometries that
+    get_dissolve_boundary_edge_ids picks (edges_gdf must be the layer the topology was
+    built from, in its original row order)."""
+    edge_ids = get_dissolve_boundary_edge_ids(topology, face_mask)
+    return shapely.line_merge(
+        shapely.union_all(edges_gdf.geometry.values.to_numpy()[edge_ids])
+    )
+
+
+########################################################################################
+###################################### Benchmark #######################################
+########################################################################################
+
+
+def time_query(query_func, n_repeats: int) -> float:
+    """Returns the best-of-n_repeats wall time (in seconds) of query_func()."""
+    timings = []
+    for _ in range(n_repeats):
+        start_time = time.perf_counter()
+        query_func()
+        timings.append(time.perf_counter() - start_time)
+    return min(timings)
+
+
+def benchmark_topology_vs_geometry_queries(
+    state_abrv: str,
+    county_name: str,
+    year: str,
+    n_repeats: int = 3,
+    project_root_dir: os.path = get_project_root_dir(),
+) -> pd.DataFrame:
+    """Times the topology array lookups against the equivalent shapely-based queries
+    for one county."""
+    county_kwargs = {
+        "state_abrv": state_abrv,
+        "county_name": county_name,
+        "year": year,
+        "project_root_dir": project_root_dir,
+    }
+    topology = load_county_topology(**county_kwargs)
+    faces_gdf = load_tiger_topological_faces_in_county(**county_kwargs)
+    edges_gdf = load_tiger_topological_edges_in_county(**county_kwargs)
+    water_gdf = load_tiger_area_water_in_county(**county_kwargs)
+    water_gdf = reproject_gdf(gdf=water_gdf, target_crs=faces_gdf.crs)
+    suffix = get_faces_geocode_suffix(list(faces_gdf.columns))
+    faces_gdf["tract_geoid"] = (
+        faces_gdf[f"STATEFP{suffix}"]
+        + faces_gdf[f"COUNTYFP{suffix}"]
+        + faces_gdf[f"TRACTCE{suffix}"]
+    )
+    tracts_gdf = faces_gdf[["tract_geoid", "geometry"]].dissolve(by="tract_geoid")
+    tracts_gdf = tracts_gdf.reset_index()
+
+    def water_faces_by_geometry() -> np.ndarray:
+        face_ids, _ = water_gdf.sindex.query(
+            faces_gdf.geometry.representative_point(), predicate="within"
+        )
+        return faces_gdf["TFID"].values[np.unique(face_ids)]
+
+    def tracts_bordering_water_by_topology() -> List[np.ndarray]:
+        return [
+            get_tracts_bordering_hydro_feature(topology, hydro_id)
+            for hydro_id in topology["hydro_ids"]
+        ]
+
+    def tracts_bordering_water_by_geometry() -> pd.Series:
+        water_ids, tract_ids = tracts_gdf.sindex.query(
+            water_gdf.geometry.boundary, predicate="intersects"
+        )
+        return pd.Series(tracts_gdf["tract_geoid"].values[tract_ids]).groupby(
+            water_gdf["HYDROID"].values[water_ids]
+        ).unique()
+
+    def dissolve_tracts_by_topology() -> List[shapely.Geometry]:
+        return [
+            dissolve_faces_to_boundary_lines(
+                edges_gdf, topology, topology["face_tract_codes"] == tract_code
+            )
+            for tract_code in range(len(topology["tract_geoids"]))
+        ]
+
+    def dissolve_tracts_by_geometry() -> gpd.GeoSeries:
+        tract_faces_gdf = faces_gdf[["tract_geoid", "geometry"]]
+        return tract_faces_gdf.dissolve(by="tract_geoid").boundary
+
+    benchmark_queries = {
+        "water faces": (
+            lambda: get_water_face_tfids(topology),
+            water_faces_by_geometry,
+        ),
+        "tracts bordering each hydro feature": (
+            tracts_bordering_water_by_topology,
+            tracts_bordering_water_by_geometry,
+        ),
+        "dissolve faces to tract outlines": (
+            dissolve_tracts_by_topology,
+            dissolve_tracts_by_geometry,
+        ),
+    }
+    benchmark_results = []
+    for query_name, (topology_func, geometry_func) in benchmark_queries.items():
+        topology_seconds = time_query(topology_func, n_repeats=n_repeats)
+        geometry_seconds = time_query(geometry_func, n_repeats=n_repeats)
+        benchmark_results.append(
+            {
+                "query": query_name,
+                "topology_seconds": topology_seconds,
+                "geometry_seconds": geometry_seconds,
+                "speedup": geometry_seconds / topology_seconds,
+            }
+        )
+    return pd.DataFrame(benchmark_results)
+
+
+def main() -> None:
+    benchmark_df = benchmark_topology_vs_geometry_queries(
+        state_abrv="MI", county_name="Berrien", year="2021"
+    )
+    print(benchmark_df.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
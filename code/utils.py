@@ -5,6 +5,8 @@ from urllib.request import urlretrieve
 import pandas as pd
 import geopandas as gpd
 
+from raw_data_cache import get_raw_data_cache_location, retrieve_url_via_cache
+
 
 def get_project_root_dir() -> os.path:
     return os.path.dirname(os.path.dirname(os.path.abspath("__file__")))
@@ -17,12 +19,24 @@ def setup_project_structure(project_root_dir: os.path = get_project_root_dir())
     os.makedirs(os.path.join(project_root_dir, "output"), exist_ok=True)
 
 
+def retrieve_url(url: str, file_path: os.path, force_repull: bool = False) -> None:
+    """Pulls url to file_path, through the shared raw data cache if the
+    THIS_LAND_RAW_DATA_CACHE env var points to one."""
+    if get_raw_data_cache_location() is not None:
+        retrieve_url_via_cache(url=url, file_path=file_path, force_repull=force_repull)
+    else:
+        if os.path.isfile(file_path):
+            # the file may be a hardlink to a read-only cache blob
+            os.remove(file_path)
+        urlretrieve(url, file_path)
+
+
 def extract_csv_from_url(
     file_path: os.path, url: str, force_repull: bool = False, return_df: bool = True
 ) -> pd.DataFrame:
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
     if not os.path.isfile(file_path) or force_repull:
-        urlretrieve(url, file_path)
+        retrieve_url(url=url, file_path=file_path, force_repull=force_repull)
     if return_df:
         return pd.read_csv(file_path)
 
@@ -36,9 +50,16 @@ def extract_file_from_url(
 ) -> pd.DataFrame:
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
     if not os.path.isfile(file_path) or force_repull:
-        urlretrieve(url, file_path)
+        retrieve_url(url=url, file_path=file_path, force_repull=force_repull)
     if return_df:
         if data_format in ["csv", "zipped_csv"]:
             return pd.read_csv(file_path)
         elif data_format in ["shp", "geojson"]:
             return gpd.read_file(file_path)
+
+
+def get_file_fingerprint(file_path: os.path) -> str:
+    """Cheap fingerprint (size and modification time) that changes whenever a file is
+    re-extracted."""
+    file_stat = os.stat(file_path)
+    return f"{file_stat.st_size}-{file_stat.st_mtime_ns}"